@@ -0,0 +1,371 @@
+"""Асинхронные варианты эндпоинтов чтения для запуска под ASGI.
+
+Отдают те же данные, что и viewset-ы DRF, но читают базу через
+асинхронный ORM (aiterator, aget, acount), поэтому медленный запрос
+к базе не занимает воркер целиком. Связанные объекты выбираются
+отдельными запросами по id страницы: prefetch_related с aiterator()
+не работает.
+"""
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.storage import default_storage
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.forms import ModelMultipleChoiceField
+from django.http import JsonResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import token_user_cache
+from .ingredient_index import ingredient_index
+from recipes.models import Ingredient, IngredientQuantity, Recipe, Tag, User
+
+PAGE_SIZE = 6
+CART_PAGE_SIZE = 100
+TRUE_VALUES = ('1', 'true', 'True')
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def error_response(detail, status):
+    response = json_response({'detail': detail}, status)
+    if status == 401:
+        response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+async def authenticate(request):
+    """Пользователь по заголовку Authorization: Token <ключ>.
+
+    Возвращает AnonymousUser для запроса без токена и None для
+    неверного токена.
+    """
+    keyword, _space, key = request.headers.get(
+        'Authorization', '',
+    ).partition(' ')
+    if keyword != 'Token' or not key:
+        return AnonymousUser()
+    user = await token_user_cache.aget(key)
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+def with_user(view):
+    """Передаёт во view пользователя по токену, на неверный токен - 401."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await authenticate(request)
+        if user is None:
+            return error_response(_('Invalid token.'), 401)
+        return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+def get_absolute_url(request, name):
+    if not name:
+        return None
+    return request.build_absolute_uri(default_storage.url(name))
+
+
+def get_variant_urls(request, variants):
+    return {
+        name: get_absolute_url(request, path)
+        for name, path in variants.get('files', {}).items()
+    }
+
+
+def get_page_number(request):
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        return None
+    return number if number >= 1 else None
+
+
+async def paginate(request, queryset, page_size):
+    """Номер страницы, срез выборки и общее число объектов.
+
+    Возвращает None, если страницы с таким номером нет.
+    """
+    number = get_page_number(request)
+    count = await queryset.acount()
+    if number is None or (number - 1) * page_size >= max(count, 1):
+        return None
+    offset = (number - 1) * page_size
+    return number, queryset[offset:offset + page_size], count
+
+
+def get_paginated_data(request, number, page_size, count, results):
+    url = request.build_absolute_uri()
+    if number * page_size < count:
+        next_link = replace_query_param(url, 'page', number + 1)
+    else:
+        next_link = None
+    if number == 1:
+        previous_link = None
+    elif number == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', number - 1)
+    return {
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': results,
+    }
+
+
+async def get_recipe_tags(recipe_ids):
+    tags = defaultdict(list)
+    async for row in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__slug', 'tag__color',
+    ).order_by('tag__name').aiterator():
+        tags[row['recipe_id']].append({
+            'id': row['tag_id'],
+            'name': row['tag__name'],
+            'slug': row['tag__slug'],
+            'color': row['tag__color'],
+        })
+    return tags
+
+
+async def get_recipe_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    async for row in IngredientQuantity.objects.filter(
+        current_recipe_id__in=recipe_ids,
+    ).values(
+        'current_recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount',
+    ).order_by('pk').aiterator():
+        ingredients[row['current_recipe_id']].append({
+            'id': row['ingredient_id'],
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['amount'],
+        })
+    return ingredients
+
+
+def get_user_data(user, is_subscribed):
+    return {
+        'email': user.email,
+        'id': user.id,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'username': user.username,
+        'is_subscribed': is_subscribed,
+    }
+
+
+async def get_recipes_data(request, queryset):
+    """Рецепты в том виде, в каком их отдаёт ListRecipeSerializer."""
+    recipes = [recipe async for recipe in queryset.aiterator()]
+    recipe_ids = [recipe.id for recipe in recipes]
+    tags = await get_recipe_tags(recipe_ids)
+    ingredients = await get_recipe_ingredients(recipe_ids)
+    return [
+        {
+            'id': recipe.id,
+            'tags': tags[recipe.id],
+            'author': get_user_data(
+                recipe.author, recipe.author_is_subscribed,
+            ),
+            'ingredients': ingredients[recipe.id],
+            'image': get_absolute_url(request, recipe.image.name),
+            'image_variants': get_variant_urls(
+                request, recipe.image_variants,
+            ),
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'is_favorited': recipe.is_favorited,
+            'is_in_shopping_cart': recipe.is_in_shopping_cart,
+        }
+        for recipe in recipes
+    ]
+
+
+def get_recipes_queryset(user):
+    return Recipe.objects.with_user_flags(
+        user,
+    ).with_author_subscription(
+        user,
+    ).select_related('author')
+
+
+async def filter_recipes(request, queryset):
+    """Те же фильтры, что в RecipeFilter. Возвращает (queryset, ошибки)."""
+    author = request.GET.get('author')
+    if author:
+        queryset = queryset.filter(author__id__icontains=author)
+    slugs = set(request.GET.getlist('tags'))
+    if slugs:
+        known = {
+            slug async for slug in Tag.objects.filter(
+                slug__in=slugs,
+            ).values_list('slug', flat=True).aiterator()
+        }
+        unknown = sorted(slugs - known)
+        if unknown:
+            return queryset, {'tags': [
+                ModelMultipleChoiceField.default_error_messages[
+                    'invalid_choice'
+                ] % {'value': unknown[0]},
+            ]}
+        queryset = queryset.filter(tags__slug__in=slugs).distinct()
+    if request.GET.get('is_favorited') in TRUE_VALUES:
+        queryset = queryset.filter(is_favorited=True)
+    if request.GET.get('is_in_shopping_cart') in TRUE_VALUES:
+        queryset = queryset.filter(is_in_shopping_cart=True)
+    return queryset, None
+
+
+@with_user
+async def recipe_list(request, user):
+    queryset, errors = await filter_recipes(
+        request, get_recipes_queryset(user),
+    )
+    if errors:
+        return json_response(errors, 400)
+    page_size = PAGE_SIZE
+    if request.GET.get('is_in_shopping_cart'):
+        page_size = CART_PAGE_SIZE
+    page = await paginate(request, queryset, page_size)
+    if page is None:
+        return error_response(
+            PageNumberPagination.invalid_page_message, 404,
+        )
+    number, queryset, count = page
+    return json_response(get_paginated_data(
+        request, number, page_size, count,
+        await get_recipes_data(request, queryset),
+    ))
+
+
+@with_user
+async def recipe_detail(request, user, pk):
+    data = await get_recipes_data(
+        request, get_recipes_queryset(user).filter(pk=pk),
+    )
+    if not data:
+        return error_response(NotFound.default_detail, 404)
+    return json_response(data[0])
+
+
+@with_user
+async def tag_list(request, user):
+    return json_response([
+        tag async for tag in Tag.objects.values(
+            'id', 'name', 'slug', 'color',
+        ).aiterator()
+    ])
+
+
+@with_user
+async def ingredient_list(request, user):
+    name = request.GET.get('name')
+    if name:
+        # Индекс ингредиентов живёт в памяти процесса и обращается
+        # к базе только при перестроении.
+        return json_response(await sync_to_async(ingredient_index.search)(
+            name, settings.INGREDIENT_SEARCH_LIMIT,
+        ))
+    return json_response([
+        ingredient async for ingredient in Ingredient.objects.values(
+            'id', 'name', 'measurement_unit',
+        ).aiterator()
+    ])
+
+
+def get_recipes_limit(request):
+    try:
+        limit = int(request.GET.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return settings.SUBSCRIPTION_RECIPES_LIMIT_MAX
+    return max(0, min(limit, settings.SUBSCRIPTION_RECIPES_LIMIT_MAX))
+
+
+async def get_recipes_previews(request, author_ids, limit):
+    """Последние limit рецептов каждого автора одним запросом."""
+    previews = defaultdict(list)
+    async for recipe in Recipe.objects.filter(
+        author_id__in=author_ids,
+    ).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('pub_date').desc(),
+        ),
+    ).filter(
+        position__lte=limit,
+    ).only(
+        'id', 'author_id', 'name', 'image', 'image_variants',
+        'cooking_time', 'pub_date',
+    ).order_by('-pub_date').aiterator():
+        previews[recipe.author_id].append({
+            'name': recipe.name,
+            'id': recipe.id,
+            'image': get_absolute_url(request, recipe.image.name),
+            'image_variants': get_variant_urls(
+                request, recipe.image_variants,
+            ),
+            'cooking_time': recipe.cooking_time,
+        })
+    return previews
+
+
+@with_user
+async def subscriptions(request, user):
+    if not user.is_authenticated:
+        return error_response(NotAuthenticated.default_detail, 401)
+    queryset = User.objects.filter(
+        following__following=user,
+    ).order_by('username')
+    page = await paginate(request, queryset, PAGE_SIZE)
+    if page is None:
+        return error_response(
+            PageNumberPagination.invalid_page_message, 404,
+        )
+    number, queryset, count = page
+    authors = [author async for author in queryset.aiterator()]
+    author_ids = [author.id for author in authors]
+    # values_list() с annotate() в Django 4.2 выполняет запрос ещё
+    # до первого шага aiterator(), поэтому здесь values().
+    recipes_count = {
+        row['author_id']: row['recipes']
+        async for row in Recipe.objects.filter(
+            author_id__in=author_ids,
+        ).values('author_id').annotate(
+            recipes=Count('pk'),
+        ).order_by().aiterator()
+    }
+    previews = await get_recipes_previews(
+        request, author_ids, get_recipes_limit(request),
+    )
+    return json_response(get_paginated_data(
+        request, number, PAGE_SIZE, count,
+        [
+            {
+                **get_user_data(author, True),
+                'recipes': previews[author.id],
+                'recipes_count': recipes_count.get(author.id, 0),
+            }
+            for author in authors
+        ],
+    ))
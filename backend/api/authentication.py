@@ -0,0 +1,197 @@
+"""Аутентификация без запроса к базе на каждый вызов API."""
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from foodgram.metrics import record_cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from recipes.models import User
+
+JWT_USER_CLAIMS = (
+    'email', 'username', 'first_name', 'last_name', 'is_staff', 'is_superuser',
+)
+# Поля пользователя, которые хранит кеш токенов: без пароля и дат.
+CACHED_USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def get_user_fields(user):
+    return {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+
+
+def build_user(fields):
+    """Пользователь из словаря полей, как будто прочитанный из базы."""
+    user = User(**fields)
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+class TokenUserCache:
+    """Пользователи по ключам токенов: LRU в памяти процесса поверх
+    общего кеша Django.
+
+    Хранятся только поля CACHED_USER_FIELDS, без хеша пароля, а наружу
+    отдаётся собранный из них пользователь. В памяти запись живёт
+    AUTH_TOKEN_LOCAL_TIMEOUT секунд, в общем кеше -
+    AUTH_TOKEN_CACHE_TIMEOUT. При удалении токена или изменении
+    пользователя запись удаляется из общего кеша и из памяти текущего
+    процесса, остальные процессы забудут её по истечении локального срока.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._items = OrderedDict()
+
+    @staticmethod
+    def get_cache_key(key):
+        return 'auth-user:' + sha256(key.encode()).hexdigest()
+
+    def get_local(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            fields, expires = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return fields
+
+    def set_local(self, key, fields):
+        with self._lock:
+            self._items[key] = (
+                fields, time.monotonic() + settings.AUTH_TOKEN_LOCAL_TIMEOUT,
+            )
+            self._items.move_to_end(key)
+            while len(self._items) > settings.AUTH_TOKEN_LOCAL_SIZE:
+                self._items.popitem(last=False)
+
+    def get(self, key):
+        """Пользователь с токеном key или None."""
+        fields = self.get_local(key)
+        if fields is None:
+            fields = cache.get(self.get_cache_key(key))
+            record_cache('auth', fields is not None)
+            if fields is None:
+                token = Token.objects.select_related('user').filter(
+                    key=key,
+                ).first()
+                if token is None:
+                    return None
+                fields = get_user_fields(token.user)
+                cache.set(
+                    self.get_cache_key(key),
+                    fields,
+                    settings.AUTH_TOKEN_CACHE_TIMEOUT,
+                )
+            self.set_local(key, fields)
+        return build_user(fields)
+
+    async def aget(self, key):
+        fields = self.get_local(key)
+        if fields is None:
+            fields = await cache.aget(self.get_cache_key(key))
+            record_cache('auth', fields is not None)
+            if fields is None:
+                token = await Token.objects.select_related('user').filter(
+                    key=key,
+                ).afirst()
+                if token is None:
+                    return None
+                fields = get_user_fields(token.user)
+                await cache.aset(
+                    self.get_cache_key(key),
+                    fields,
+                    settings.AUTH_TOKEN_CACHE_TIMEOUT,
+                )
+            self.set_local(key, fields)
+        return build_user(fields)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+        cache.delete_many([self.get_cache_key(key) for key in keys])
+
+
+token_user_cache = TokenUserCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который берёт пользователя из token_user_cache.
+
+    В кеше нет пароля и остальных полей модели, поэтому для записи
+    пользователь читается из базы как обычно: его могут сохранить
+    или проверить пароль.
+    """
+
+    def authenticate(self, request):
+        self.stateless = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not self.stateless:
+            return super().authenticate_credentials(key)
+        user = token_user_cache.get(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user, Token(key=key, user=user)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Кладёт в JWT поля пользователя, которые отдаёт API, и его права."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in JWT_USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Bearer-токены simplejwt.
+
+    Для безопасных запросов пользователь собирается из полей токена без
+    обращения к базе, поэтому изменения профиля, прав и блокировка видны
+    только после выпуска нового токена (ACCESS_TOKEN_LIFETIME). Для
+    записи пользователь читается из базы как обычно.
+    """
+
+    def authenticate(self, request):
+        self.stateless = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not self.stateless or any(
+            claim not in validated_token for claim in JWT_USER_CLAIMS
+        ):
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+        return build_user({
+            'id': user_id,
+            'is_active': True,
+            **{claim: validated_token[claim] for claim in JWT_USER_CLAIMS},
+        })
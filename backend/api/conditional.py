@@ -0,0 +1,99 @@
+"""Условные GET-запросы (ETag, Last-Modified) для рецептов."""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers, quote_etag)
+from django.utils.http import http_date
+from foodgram.metrics import record_cache
+
+from .response_cache import (get_normalized_query, get_object_version,
+                             get_response_cache_key)
+from recipes.versions import get_user_state
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на повторные запросы list и retrieve без сериализации.
+
+    ETag складывается из наибольшего updated_at выбранных рецептов, их
+    числа, параметров запроса и версий избранного, списка покупок и
+    подписок пользователя, от которых зависят флаги в ответе.
+    Last-Modified отдаётся только анонимным пользователям: для
+    остальных ответ меняется и без изменения рецептов.
+    """
+
+    def get_state(self, get_queryset, request, user_state):
+        """Наибольший updated_at и число рецептов в выборке.
+
+        Значение кешируется до смены версии каталога или рецепта, а для
+        пользователя - ещё и до смены версий его избранного, списка
+        покупок и подписок: от них зависят фильтры is_favorited
+        и is_in_shopping_cart. При попадании выборка даже не строится:
+        фильтры по тегам сами обращаются к базе.
+        """
+        key = '{}:state:{}'.format(
+            get_response_cache_key(request, get_object_version(self)),
+            user_state,
+        )
+        state = cache.get(key)
+        record_cache('conditional', state is not None)
+        if state is None:
+            state = get_queryset().order_by().aggregate(
+                last_modified=Max('updated_at'),
+                count=Count('pk'),
+            )
+            cache.set(key, state, settings.RESPONSE_CACHE_TIMEOUT)
+        return state
+
+    def get_conditional_response(self, handler, get_queryset, request,
+                                 *args, **kwargs):
+        user_state = get_user_state(request.user)
+        state = self.get_state(get_queryset, request, user_state)
+        last_modified = state['last_modified']
+        etag = quote_etag(md5(':'.join((
+            str(last_modified),
+            str(state['count']),
+            request.path,
+            get_normalized_query(request),
+            user_state,
+        )).encode()).hexdigest())
+        timestamp = None
+        if last_modified and not request.user.is_authenticated:
+            timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=timestamp,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        if request.user.is_authenticated:
+            patch_cache_control(response, no_cache=True, private=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list,
+            lambda: self.filter_queryset(self.get_queryset()),
+            request, *args, **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            queryset = self.get_queryset().filter(
+                **{self.lookup_field: lookup}
+            )
+        except (TypeError, ValueError):
+            return super().retrieve(request, *args, **kwargs)
+        return self.get_conditional_response(
+            super().retrieve, lambda: queryset, request, *args, **kwargs,
+        )
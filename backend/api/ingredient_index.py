@@ -0,0 +1,67 @@
+"""Индекс ингредиентов в памяти процесса для автодополнения."""
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS_VERSION, get_version
+
+
+class IngredientIndex:
+    """Отсортированный по casefold-названию справочник ингредиентов.
+
+    Строится лениво в каждом процессе и перестраивается, когда меняется
+    версия ингредиентов, которую сдвигают сигналы модели Ingredient.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._data = ([], [])
+
+    def _build(self, version):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit',
+            )
+        )
+        self._data = (
+            [key for key, *_ in rows],
+            [
+                {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+                for _, pk, name, measurement_unit in rows
+            ],
+        )
+        self._version = version
+
+    def _refresh(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+
+    def search(self, query, limit):
+        """Сначала ингредиенты, начинающиеся с query, затем содержащие его."""
+        self._refresh()
+        keys, items = self._data
+        query = query.casefold()
+        result = []
+        position = bisect_left(keys, query)
+        while (
+            position < len(keys)
+            and len(result) < limit
+            and keys[position].startswith(query)
+        ):
+            result.append(items[position])
+            position += 1
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if query in key and not key.startswith(query):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,335 @@
+import json
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.pagination import encode_cursor
+from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag, User)
+from users.models import Subscribe
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, 'benchmarks', 'baseline.json',
+)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+BATCH_SIZE = 5000
+INGREDIENTS_PER_RECIPE = 5
+CART_SIZE = 50
+SUBSCRIPTIONS = 30
+PAGE_SIZE = 6
+
+ENDPOINTS = (
+    ('recipes-list', '/api/recipes/', True),
+    ('recipes-list-anonymous', '/api/recipes/', False),
+    ('recipes-list-in-cart', '/api/recipes/?is_in_shopping_cart=1', True),
+    ('recipes-list-by-tags', '/api/recipes/?tags=breakfast&tags=lunch', True),
+    ('recipes-list-deep-page', '/api/recipes/?page={deep_page}', True),
+    ('recipes-list-deep-cursor', '/api/recipes/?cursor={deep_cursor}', True),
+    ('recipes-detail', '/api/recipes/{recipe_id}/', True),
+    (
+        'recipes-download-shopping-cart',
+        '/api/recipes/download_shopping_cart/',
+        True,
+    ),
+    ('users-subscriptions', '/api/users/subscriptions/?recipes_limit=3', True),
+    (
+        'ingredients-search',
+        '/api/ingredients/?name={ingredient_prefix}',
+        False,
+    ),
+    ('tags-list', '/api/tags/', False),
+    ('users-list', '/api/users/', True),
+    ('users-me', '/api/users/me/', True),
+)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def bulk_create(model, objects):
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def seed(size):
+    """Заполняет базу набором данных на size рецептов."""
+    rng = random.Random(size)
+    users_count = max(size // 10, SUBSCRIPTIONS + 1)
+    bulk_create(User, (
+        User(
+            username=f'user{i}',
+            email=f'user{i}@example.com',
+            first_name='Имя',
+            last_name='Фамилия',
+        ) for i in range(users_count)
+    ))
+    user_ids = list(User.objects.values_list('id', flat=True))
+    bulk_create(Tag, (
+        Tag(name=name, slug=slug, color=color)
+        for name, slug, color in (
+            ('Завтрак', 'breakfast', '#E26C2D'),
+            ('Обед', 'lunch', '#49B64E'),
+            ('Ужин', 'dinner', '#8775D2'),
+        )
+    ))
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.json')
+    with open(path, encoding='utf-8') as json_file:
+        bulk_create(Ingredient, (
+            Ingredient(**ingredient) for ingredient in json.load(json_file)
+        ))
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    bulk_create(Recipe, (
+        Recipe(
+            author_id=rng.choice(user_ids),
+            name=f'Рецепт {i}',
+            image='recipes/benchmark.jpg',
+            cooking_time=rng.randint(1, 120),
+            text='Описание рецепта. ' * 20,
+        ) for i in range(size)
+    ))
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    bulk_create(IngredientQuantity, (
+        IngredientQuantity(
+            current_recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=rng.randint(1, 500),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, INGREDIENTS_PER_RECIPE,
+        )
+    ))
+    bulk_create(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+    ))
+    user = User.objects.create(
+        username='benchmark',
+        email='benchmark@example.com',
+        first_name='Имя',
+        last_name='Фамилия',
+    )
+    cart = rng.sample(recipe_ids, min(CART_SIZE, len(recipe_ids)))
+    bulk_create(Favorite, (
+        Favorite(user=user, recipe_id=recipe_id) for recipe_id in cart
+    ))
+    bulk_create(ShoppingCart, (
+        ShoppingCart(user=user, recipe_id=recipe_id) for recipe_id in cart
+    ))
+    ShoppingListItem.objects.rebuild([user.id])
+    bulk_create(Subscribe, (
+        Subscribe(following=user, author_id=author_id)
+        for author_id in rng.sample(user_ids, SUBSCRIPTIONS)
+    ))
+    deep_page = size * 9 // 10 // PAGE_SIZE + 1
+    deep = Recipe.objects.order_by('-pub_date', '-id')[
+        (deep_page - 1) * PAGE_SIZE - 1
+    ]
+    return user, {
+        'recipe_id': recipe_ids[len(recipe_ids) // 2],
+        'ingredient_prefix': 'ка',
+        'deep_page': deep_page,
+        'deep_cursor': encode_cursor([
+            Recipe._meta.get_field('pub_date').value_to_string(deep),
+            str(deep.id),
+        ]),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет число SQL-запросов и время ответа эндпоинтов API '
+        'и сравнивает их с сохранённым бюджетом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=(1000, ),
+            help='Размеры наборов данных (число рецептов).',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Число замеров на каждый эндпоинт.',
+        )
+        parser.add_argument(
+            '--baseline', default=DEFAULT_BASELINE,
+            help='Путь к JSON-файлу с бюджетом запросов.',
+        )
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Записать текущие результаты как новый бюджет.',
+        )
+        parser.add_argument(
+            '--latency-tolerance', type=float,
+            help=(
+                'Допустимый рост p95 относительно бюджета (например, 1.5). '
+                'По умолчанию время только выводится.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                'Бенчмарк рассчитан на SQLite: запустите его с DEBUG=True.'
+            )
+        results = {}
+        setup_test_environment()
+        try:
+            # Пользователи токенов в памяти процесса пережили бы
+            # cache.clear() и спрятали бы запрос холодного пути.
+            with override_settings(CACHES=CACHES, AUTH_TOKEN_LOCAL_TIMEOUT=0):
+                for size in options['sizes']:
+                    results[str(size)] = self.run_size(
+                        size, options['repeat'],
+                    )
+        finally:
+            teardown_test_environment()
+        if options['update_baseline']:
+            self.write_baseline(options['baseline'], results)
+            return
+        self.check_baseline(
+            options['baseline'], results, options['latency_tolerance'],
+        )
+
+    def run_size(self, size, repeat):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        cache.clear()
+        try:
+            started = time.perf_counter()
+            user, params = seed(size)
+            self.stdout.write(
+                f'Набор {size}: данные созданы за '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            token = Token.objects.create(user=user)
+            return {
+                name: self.measure(
+                    url.format(**params),
+                    token if authenticated else None,
+                    repeat,
+                    name,
+                )
+                for name, url, authenticated in ENDPOINTS
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def request(self, client, url, name):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'{name}: {url} вернул {response.status_code}')
+        return len(context.captured_queries), elapsed
+
+    def measure(self, url, token, repeat, name):
+        """Замеряет холодный путь (после очистки кеша) и повторный запрос.
+
+        Бюджет queries относится к холодному пути: так кеши не скрывают
+        N+1 в сериализаторах. cached_queries - запросы при тёплом кеше.
+        """
+        client = APIClient()
+        if token:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        queries = cached_queries = 0
+        timings = []
+        cached_timings = []
+        for _ in range(repeat):
+            cache.clear()
+            count, elapsed = self.request(client, url, name)
+            queries = max(queries, count)
+            timings.append(elapsed)
+            count, elapsed = self.request(client, url, name)
+            cached_queries = max(cached_queries, count)
+            cached_timings.append(elapsed)
+        result = {
+            'queries': queries,
+            'cached_queries': cached_queries,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'cached_p50_ms': round(percentile(cached_timings, 50), 2),
+            'cached_p95_ms': round(percentile(cached_timings, 95), 2),
+        }
+        self.stdout.write(
+            f'  {name}: {queries} запросов, p50 {result["p50_ms"]} мс, '
+            f'p95 {result["p95_ms"]} мс, p99 {result["p99_ms"]} мс; '
+            f'с кешем {cached_queries} запросов, '
+            f'p50 {result["cached_p50_ms"]} мс, '
+            f'p95 {result["cached_p95_ms"]} мс'
+        )
+        return result
+
+    def write_baseline(self, path, results):
+        baseline = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline.update(results)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Бюджет записан в {path}'))
+
+    def check_baseline(self, path, results, latency_tolerance):
+        if not os.path.exists(path):
+            raise CommandError(
+                f'Нет файла бюджета {path}: запустите с --update-baseline.'
+            )
+        with open(path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        errors = []
+        for size, endpoints in results.items():
+            for name, result in endpoints.items():
+                budget = baseline.get(size, {}).get(name)
+                if budget is None:
+                    errors.append(f'{size}/{name}: нет бюджета')
+                    continue
+                errors.extend(
+                    self.compare(f'{size}/{name}', result, budget,
+                                 latency_tolerance)
+                )
+        if errors:
+            raise CommandError(
+                'Превышен бюджет производительности:\n' + '\n'.join(errors)
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджет не превышен.'))
+
+    def compare(self, label, result, budget, latency_tolerance):
+        errors = []
+        for key in ('queries', 'cached_queries'):
+            if key in budget and result[key] > budget[key]:
+                errors.append(
+                    f'{label}: {key} {result[key]} при бюджете {budget[key]}'
+                )
+        if latency_tolerance:
+            for key in ('p95_ms', 'cached_p95_ms'):
+                if (
+                    key in budget
+                    and result[key] > budget[key] * latency_tolerance
+                ):
+                    errors.append(
+                        f'{label}: {key} {result[key]} мс '
+                        f'при бюджете {budget[key]} мс'
+                    )
+        return errors
@@ -0,0 +1,186 @@
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from .benchmark_api import percentile
+from recipes.models import User
+
+ENDPOINTS = (
+    ('recipes-list', '/api/recipes/?page=2', '/api/async/recipes/?page=2'),
+    (
+        'recipes-detail',
+        '/api/recipes/{recipe_id}/',
+        '/api/async/recipes/{recipe_id}/',
+    ),
+    ('tags-list', '/api/tags/', '/api/async/tags/'),
+    (
+        'ingredients-search',
+        '/api/ingredients/?name=ка',
+        '/api/async/ingredients/?name=ка',
+    ),
+    (
+        'users-subscriptions',
+        '/api/users/subscriptions/?recipes_limit=3',
+        '/api/async/users/subscriptions/?recipes_limit=3',
+    ),
+)
+SERVERS = {
+    'wsgi': ('foodgram.wsgi:application', ()),
+    'asgi': (
+        'foodgram.asgi:application',
+        ('--worker-class', 'uvicorn.workers.UvicornWorker'),
+    ),
+}
+READY_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность эндпоинтов чтения под WSGI '
+        '(gunicorn, синхронные воркеры) и их асинхронных вариантов '
+        'под ASGI (uvicorn) при одновременных запросах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wsgi-url', default='http://127.0.0.1:8000',
+            help='Адрес сервера с синхронными view.',
+        )
+        parser.add_argument(
+            '--asgi-url', default='http://127.0.0.1:8001',
+            help='Адрес сервера, запущенного из foodgram.asgi.',
+        )
+        parser.add_argument(
+            '--spawn-workers', type=int, default=0,
+            help=(
+                'Запустить оба сервера через gunicorn с этим числом '
+                'воркеров на портах из --wsgi-url и --asgi-url.'
+            ),
+        )
+        parser.add_argument(
+            '--concurrency', nargs='+', type=int, default=(1, 8, 32),
+            help='Число одновременных запросов.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Число запросов на эндпоинт и уровень параллельности.',
+        )
+        parser.add_argument(
+            '--token',
+            help='Токен пользователя. По умолчанию создаётся для --username.',
+        )
+        parser.add_argument(
+            '--username',
+            help='Пользователь с подписками, по умолчанию первый в базе.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        token = options['token'] or self.get_token(options['username'])
+        urls = {'wsgi': options['wsgi_url'], 'asgi': options['asgi_url']}
+        processes = []
+        try:
+            if options['spawn_workers']:
+                for kind, url in urls.items():
+                    processes.append(
+                        self.spawn(kind, url, options['spawn_workers']),
+                    )
+                for url, process in zip(urls.values(), processes):
+                    self.wait_ready(url, process)
+            self.run(urls, token)
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    def get_token(self, username):
+        users = User.objects.order_by('id')
+        if username:
+            users = users.filter(username=username)
+        user = users.first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей: заполните базу или передайте --token.'
+            )
+        return Token.objects.get_or_create(user=user)[0].key
+
+    def spawn(self, kind, url, workers):
+        application, extra = SERVERS[kind]
+        address = urlsplit(url).netloc
+        self.stdout.write(f'Запуск {kind} на {address}')
+        return subprocess.Popen(
+            (
+                sys.executable, '-m', 'gunicorn', application,
+                '--bind', address,
+                '--workers', str(workers),
+                '--log-level', 'warning',
+                *extra,
+            ),
+            cwd=settings.BASE_DIR,
+        )
+
+    def wait_ready(self, url, process):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                requests.get(f'{url}/api/tags/', timeout=5)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise CommandError(f'Сервер {url} не запустился.')
+
+    def run(self, urls, token):
+        headers = {'Authorization': f'Token {token}'}
+        response = requests.get(
+            f'{urls["wsgi"]}/api/recipes/', headers=headers, timeout=30,
+        )
+        response.raise_for_status()
+        results = response.json()['results']
+        if not results:
+            raise CommandError('Нет рецептов: заполните базу.')
+        params = {'recipe_id': results[0]['id']}
+        for name, wsgi_path, asgi_path in ENDPOINTS:
+            for concurrency in self.options['concurrency']:
+                for kind, path in (('wsgi', wsgi_path), ('asgi', asgi_path)):
+                    self.measure(
+                        name, kind, concurrency,
+                        urls[kind] + path.format(**params), headers,
+                    )
+
+    def measure(self, name, kind, concurrency, url, headers):
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                local.session.headers.update(headers)
+            started = time.perf_counter()
+            try:
+                status = local.session.get(url, timeout=60).status_code
+            except requests.RequestException:
+                status = None
+            return (time.perf_counter() - started) * 1000, status
+
+        total = self.options['requests']
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(fetch, range(concurrency)))
+            started = time.perf_counter()
+            results = list(executor.map(fetch, range(total)))
+            elapsed = time.perf_counter() - started
+        timings = [timing for timing, _ in results]
+        errors = sum(status != 200 for _, status in results)
+        self.stdout.write(
+            f'  {name} [{kind}] x{concurrency}: '
+            f'{total / elapsed:.1f} запросов/с, '
+            f'p50 {percentile(timings, 50):.2f} мс, '
+            f'p95 {percentile(timings, 95):.2f} мс'
+            + (f', ошибок: {errors}' if errors else '')
+        )
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from django.utils import timezone
+
+from api.management.commands.benchmark_api import percentile
+from recipes.management.commands.generate_fake_data import insert_rows
+from recipes.models import Ingredient, Recipe, User
+
+PREFIXES = ('карт', 'мол', 'соль', 'яблок', 'сыр')
+BATCH_SIZE = 50000
+
+
+def seed(size):
+    """Создаёт size ингредиентов и size рецептов с реалистичными названиями."""
+    path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.json')
+    with open(path, encoding='utf-8') as json_file:
+        names = [item['name'] for item in json.load(json_file)]
+    author = User.objects.create(
+        username='benchmark',
+        email='benchmark@example.com',
+    )
+    pub_date = connection.ops.adapt_datetimefield_value(timezone.now())
+    image_variants = Recipe._meta.get_field(
+        'image_variants',
+    ).get_db_prep_save({}, connection)
+    for start in range(0, size, BATCH_SIZE):
+        numbers = range(start, min(start + BATCH_SIZE, size))
+        insert_rows(
+            Ingredient,
+            ('name', 'measurement_unit'),
+            (
+                (f'{names[number % len(names)]} {number}', 'г')
+                for number in numbers
+            ),
+        )
+        insert_rows(
+            Recipe,
+            ('author_id', 'name', 'image', 'cooking_time', 'text',
+             'pub_date', 'updated_at', 'image_variants'),
+            (
+                (
+                    author.id, f'{names[number % len(names)]} {number}',
+                    'recipes/benchmark.jpg', 10, '', pub_date, pub_date,
+                    image_variants,
+                )
+                for number in numbers
+            ),
+        )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что поиск ингредиентов и рецептов по началу названия '
+        'использует индексы и укладывается в заданное время.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument(
+            '--max-ms', type=float, default=1.0,
+            help='Допустимая медиана поиска по началу названия, мс.',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            started = time.perf_counter()
+            seed(options['size'])
+            self.stdout.write(
+                f'{options["size"]} строк создано за '
+                f'{time.perf_counter() - started:.1f} с ({connection.vendor})'
+            )
+            errors = []
+            for model in (Ingredient, Recipe):
+                for lookup in ('istartswith', 'icontains'):
+                    median = self.measure(model, lookup, options)
+                    if lookup == 'istartswith' and median > options['max_ms']:
+                        errors.append(
+                            f'{model.__name__}.name__{lookup}: '
+                            f'{median:.3f} мс'
+                        )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        if errors:
+            raise CommandError(
+                f'Поиск медленнее {options["max_ms"]} мс:\n'
+                + '\n'.join(errors)
+            )
+        self.stdout.write(self.style.SUCCESS('Поиск укладывается в бюджет.'))
+
+    def measure(self, model, lookup, options):
+        timings = []
+        for number in range(options['repeat']):
+            queryset = model.objects.filter(**{
+                f'name__{lookup}': PREFIXES[number % len(PREFIXES)],
+            }).order_by().values_list('id', 'name')[:options['limit']]
+            started = time.perf_counter()
+            list(queryset)
+            timings.append((time.perf_counter() - started) * 1000)
+        sql, params = queryset.query.sql_with_params()
+        explain = (
+            'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite'
+            else 'EXPLAIN'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'{explain} {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        median = percentile(timings, 50)
+        self.stdout.write(
+            f'{model.__name__}.name__{lookup}: p50 {median:.3f} мс, '
+            f'p99 {percentile(timings, 99):.3f} мс | {plan[:120]}'
+        )
+        return median
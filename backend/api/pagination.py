@@ -1,8 +1,249 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from functools import partial
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from foodgram.metrics import record_cache
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.versions import CATALOG_VERSION, get_user_state, get_version
+
+
+def encode_cursor(position, reverse=False):
+    """Непрозрачный курсор из значений ключа сортировки."""
+    data = {'p': position}
+    if reverse:
+        data['r'] = 1
+    return b64encode(
+        json.dumps(data, separators=(',', ':')).encode(),
+        altchars=b'-_',
+    ).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(b64decode(cursor.encode(), altchars=b'-_'))
+        return data['p'], bool(data.get('r'))
+    except (BinasciiError, KeyError, TypeError, UnicodeError, ValueError):
+        raise NotFound('Неверный курсор.')
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы из статистики PostgreSQL.
+
+    Возвращает None, если оценка недоступна или таблица меньше порога
+    PAGINATION_COUNT_ESTIMATE_THRESHOLD.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row and row[0] >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+        return row[0]
+    return None
+
+
+def get_count(queryset, user_state):
+    """Число объектов для пагинации.
+
+    Для нефильтрованных больших таблиц берётся оценка PostgreSQL,
+    в остальных случаях точный COUNT(*) запоминается на
+    PAGINATION_COUNT_CACHE_TIMEOUT секунд для одинаковых запросов.
+    """
+    count = estimate_count(queryset)
+    if count is not None:
+        return count
+    sql, params = queryset.values('pk').query.sql_with_params()
+    # Версия каталога и версии данных пользователя в ключе: Paginator
+    # обрезает страницу по count, поэтому старое число после добавления
+    # рецепта в корзину или подписки прятало бы новые строки.
+    key = 'count:{}:{}:{}:{}'.format(
+        queryset.db,
+        get_version(CATALOG_VERSION),
+        user_state,
+        md5(f'{sql}{params!r}'.encode()).hexdigest(),
+    )
+    count = cache.get(key)
+    record_cache('count', count is not None)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class CountingPaginator(Paginator):
+    def __init__(self, *args, user_state='anonymous', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_state = user_state
+
+    @cached_property
+    def count(self):
+        return get_count(self.object_list, self.user_state)
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с курсорным режимом по запросу.
+
+    Если в запросе передан параметр cursor (хотя бы пустой), страницы
+    выбираются по ключу сортировки view.cursor_ordering без OFFSET
+    и без подсчёта общего числа объектов. С параметром count=false
+    страницы выбираются по номеру, но общее число не считается.
+    """
+    django_paginator_class = CountingPaginator
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
     def get_page_size(self, request):
         if request.query_params.get('is_in_shopping_cart'):
             return 100
         return 6
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.mode = None
+        if (
+            self.cursor_query_param in request.query_params
+            and getattr(view, 'cursor_ordering', None) is not None
+        ):
+            self.mode = 'cursor'
+            return self.paginate_cursor(
+                queryset, request, view.cursor_ordering,
+            )
+        if request.query_params.get(self.count_query_param) == 'false':
+            self.mode = 'uncounted'
+            return self.paginate_uncounted(queryset, request)
+        self.django_paginator_class = partial(
+            CountingPaginator, user_state=get_user_state(request.user),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode is None:
+            return super().get_paginated_response(data)
+        response = {
+            'next': self.next_link,
+            'previous': self.previous_link,
+            'results': data,
+        }
+        if self.mode == 'uncounted':
+            response = {'count': None, **response}
+        return Response(response)
+
+    def paginate_uncounted(self, queryset, request):
+        """Страница по номеру без COUNT(*): лишний объект говорит о next."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise NotFound('Неверная страница.')
+        offset = (number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        url = request.build_absolute_uri()
+        self.next_link = replace_query_param(
+            url, self.page_query_param, number + 1,
+        ) if len(results) > page_size else None
+        if number == 1:
+            self.previous_link = None
+        elif number == 2:
+            self.previous_link = remove_query_param(
+                url, self.page_query_param,
+            )
+        else:
+            self.previous_link = replace_query_param(
+                url, self.page_query_param, number - 1,
+            )
+        return results[:page_size]
+
+    def paginate_cursor(self, queryset, request, ordering):
+        """Страница после (или до) позиции курсора.
+
+        ordering - пара полей с одним направлением сортировки, второе
+        из которых уникально, например ('-pub_date', '-id'). Условие
+        записано как key1 <= v1 AND (key1 < v1 OR key2 < v2), чтобы база
+        шла по составному индексу диапазоном.
+        """
+        self.request = request
+        self.ordering = ordering
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in ordering
+        ]
+        page_size = self.get_page_size(request)
+        cursor = request.query_params[self.cursor_query_param]
+        position, reverse = None, False
+        if cursor:
+            position, reverse = decode_cursor(cursor)
+        order = [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in ordering
+        ] if reverse else list(ordering)
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(
+                position, reverse,
+            ))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+        self.next_link = (
+            self.get_cursor_link(results[-1], False)
+            if has_next and results else None
+        )
+        self.previous_link = (
+            self.get_cursor_link(results[0], True)
+            if has_previous and results else None
+        )
+        return results
+
+    def get_keyset_filter(self, position, reverse):
+        if not isinstance(position, list) or len(position) != 2:
+            raise NotFound('Неверный курсор.')
+        try:
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.fields, position)
+            ]
+        except ValidationError:
+            raise NotFound('Неверный курсор.')
+        (first, second), (first_value, second_value) = self.fields, values
+        lookup = 'lt' if self.ordering[0].startswith('-') != reverse else 'gt'
+        return (
+            Q(**{f'{first.name}__{lookup}e': first_value})
+            & (
+                Q(**{f'{first.name}__{lookup}': first_value})
+                | Q(**{f'{second.name}__{lookup}': second_value})
+            )
+        )
+
+    def get_cursor_link(self, obj, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        position = [field.value_to_string(obj) for field in self.fields]
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            encode_cursor(position, reverse),
+        )
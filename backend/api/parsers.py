@@ -0,0 +1,43 @@
+import json
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class TemporaryFileMultiPartParser(MultiPartParser):
+    """multipart/form-data, в котором файлы сразу пишутся на диск.
+
+    Обычный обработчик держит в памяти файлы до 2.5 МБ, здесь память
+    на загрузку ограничена размером чанка независимо от размера файла.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']._request
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+class RecipeMultiPartParser(TemporaryFileMultiPartParser):
+    """Рецепт в multipart/form-data: картинка файлом, списки JSON-ом.
+
+    ingredients и tags передаются JSON-строкой со списком или
+    несколькими полями с одним элементом в каждом.
+    """
+    json_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key, values in parsed.data.lists():
+            if key not in self.json_fields:
+                data[key] = values[-1]
+                continue
+            try:
+                values = [json.loads(value) for value in values]
+            except ValueError as error:
+                raise ParseError(f'{key}: некорректный JSON ({error})')
+            if len(values) == 1 and isinstance(values[0], list):
+                values = values[0]
+            data[key] = values
+        return DataAndFiles(data, parsed.files)
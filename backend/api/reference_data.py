@@ -0,0 +1,84 @@
+"""Заранее сериализованные справочники тегов и ингредиентов."""
+import gzip
+from hashlib import sha1
+from threading import Lock
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import (parse_etags, patch_cache_control,
+                                patch_vary_headers, quote_etag)
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import IngredientSerializer, TagSerializer
+from recipes.models import Ingredient, Tag
+from recipes.versions import INGREDIENTS_VERSION, TAGS_VERSION, get_version
+
+
+class ReferenceBlob:
+    """JSON справочника целиком, закодированный один раз на версию данных.
+
+    Хранит готовые байты, их gzip и ETag в памяти процесса и собирает
+    их заново, только когда сигналы модели сдвигают версию. У ответа
+    в gzip свой ETag: сильный ETag должен различать байты тела.
+    """
+
+    def __init__(self, version_name, queryset, serializer_class):
+        self.version_name = version_name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._lock = Lock()
+        self._version = None
+        self._data = None
+
+    def _build(self, version):
+        content = JSONRenderer().render(
+            self.serializer_class(self.queryset.all(), many=True).data,
+        )
+        digest = sha1(content).hexdigest()
+        self._data = (
+            content,
+            gzip.compress(content, compresslevel=9, mtime=0),
+            quote_etag(digest),
+            quote_etag(f'{digest}-gzip'),
+        )
+        self._version = version
+
+    def get(self):
+        """Возвращает (content, gzipped_content, etag, gzipped_etag)."""
+        version = get_version(self.version_name)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+        return self._data
+
+    def response(self, request):
+        content, gzipped_content, etag, gzipped_etag = self.get()
+        gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+        if gzipped:
+            content, etag = gzipped_content, gzipped_etag
+        # Для If-None-Match сравнение слабое: W/"x" совпадает с "x".
+        etags = [
+            tag.removeprefix('W/')
+            for tag in parse_etags(request.headers.get('If-None-Match', ''))
+        ]
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+            if gzipped:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.REFERENCE_DATA_MAX_AGE,
+        )
+        return response
+
+
+tags_blob = ReferenceBlob(TAGS_VERSION, Tag.objects.all(), TagSerializer)
+ingredients_blob = ReferenceBlob(
+    INGREDIENTS_VERSION, Ingredient.objects.all(), IngredientSerializer,
+)
@@ -0,0 +1,81 @@
+"""Кеш готовых ответов API для анонимных пользователей."""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from foodgram.metrics import record_cache
+from rest_framework.response import Response
+
+from recipes.versions import CATALOG_VERSION, get_version
+
+
+def get_normalized_query(request):
+    """Строка параметров запроса, не зависящая от их порядка."""
+    return '&'.join(
+        f'{name}={value}'
+        for name, values in sorted(request.query_params.lists())
+        for value in sorted(values)
+    )
+
+
+def get_object_version(view):
+    """Версия объекта для retrieve или пустая строка.
+
+    Шаблон версии задаётся атрибутом cache_version_name view. Её сдвигают
+    изменения, которые касаются одного объекта и не должны сбрасывать
+    кеши всего каталога.
+    """
+    name = getattr(view, 'cache_version_name', None)
+    lookup = view.kwargs.get(view.lookup_url_kwarg or view.lookup_field)
+    if name is None or lookup is None:
+        return ''
+    return get_version(name.format(pk=lookup))
+
+
+def get_response_cache_key(request, object_version=''):
+    """Ключ из адреса, упорядоченных параметров и версий каталога
+    и объекта.
+
+    Хост входит в ключ, потому что ссылки next и previous абсолютные.
+    """
+    query = get_normalized_query(request)
+    return 'response:{}:{}:{}'.format(
+        get_version(CATALOG_VERSION),
+        object_version,
+        md5(
+            f'{request.get_host()}{request.path}?{query}'.encode()
+        ).hexdigest(),
+    )
+
+
+class AnonymousCacheMixin:
+    """Кеширует данные ответов list и retrieve для анонимных запросов.
+
+    Ответ одинаков для всех анонимных пользователей, поэтому хранится
+    уже сериализованным. Устаревшие записи отсекает версия каталога,
+    которую сдвигают сигналы моделей рецептов, тегов и ингредиентов,
+    а для retrieve - ещё и версия объекта (см. get_object_version).
+    """
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = get_response_cache_key(request, get_object_version(self))
+        data = cache.get(key)
+        record_cache('response', data is not None)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs,
+        )
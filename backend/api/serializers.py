@@ -1,26 +1,58 @@
+from django.conf import settings
+from django.core import signing
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models.manager import BaseManager
 from django.db.transaction import atomic
-from django.shortcuts import get_object_or_404
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
 from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
-                            ShoppingCart, Tag, User)
+                            ShoppingCart, ShoppingListItem, Tag, User)
+from recipes.storage import recipe_image_storage
 from users.models import Subscribe
 
 
+class UserListSerializer(serializers.ListSerializer):
+    """Список пользователей с одним запросом подписок на всю страницу.
+
+    Списки djoser (/users/) не аннотируют is_subscribed, поэтому без
+    этого каждый пользователь проверялся бы отдельным запросом.
+    """
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, BaseManager) else data)
+        unknown = [
+            user for user in users if not hasattr(user, 'is_subscribed')
+        ]
+        if unknown:
+            request = self.context.get('request')
+            subscribed = set()
+            if request and request.user.is_authenticated:
+                subscribed = set(Subscribe.objects.filter(
+                    following=request.user, author__in=unknown,
+                ).values_list('author_id', flat=True))
+            for user in unknown:
+                user.is_subscribed = user.id in subscribed
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
+        list_serializer_class = UserListSerializer
         fields = (
             'email', 'id', 'first_name',
             'last_name', 'username', 'is_subscribed',
         )
 
     def get_is_subscribed(self, obj: User):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -115,8 +147,25 @@ class IngredientQuantityShowSerializer(serializers.ModelSerializer):
         )
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки рецепта.
+
+    Пока фоновая обработка не закончена, словарь пустой и клиент
+    показывает исходную картинку.
+    """
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for name, path in value.get('files', {}).items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
 class ListRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     author = UserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField(
         read_only=True,
@@ -128,37 +177,93 @@ class ListRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = (
-            'id', 'tags', 'author', 'ingredients', 'image',
+            'id', 'tags', 'author', 'ingredients', 'image', 'image_variants',
             'name', 'text', 'cooking_time', 'is_favorited',
             'is_in_shopping_cart',
         )
 
+    def to_representation(self, instance):
+        instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     @staticmethod
     def get_ingredients(obj):
-        ingredients = IngredientQuantity.objects.filter(current_recipe=obj)
-        return IngredientQuantityShowSerializer(ingredients, many=True).data
+        return IngredientQuantityShowSerializer(
+            obj.ingridientsquantity.all(),
+            many=True,
+        ).data
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request.user.is_authenticated:
-            return Favorite.objects.filter(
-                user=request.user,
-                recipe=obj,
-            ).exists()
-        return False
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request.user.is_authenticated:
-            return ShoppingCart.objects.filter(
-                user=request.user,
-                recipe=obj,
-            ).exists()
-        return False
+    @staticmethod
+    def get_is_favorited(obj):
+        return obj.is_favorited
+
+    @staticmethod
+    def get_is_in_shopping_cart(obj):
+        return obj.is_in_shopping_cart
+
+
+IMAGE_TOKEN_SALT = 'api.recipe-image-upload'
+
+
+class RecipeImageField(Base64ImageField):
+    """Картинка строкой base64 или файлом из multipart/form-data."""
+
+    def to_internal_value(self, data):
+        # RecipeMultiPartParser отдаёт данные обычным словарём, и DRF,
+        # добавляя к нему файлы из MultiValueDict, кладёт их списком.
+        if isinstance(data, list) and len(data) == 1:
+            data = data[0]
+        if isinstance(data, UploadedFile):
+            return serializers.ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
+
+
+class RecipeImageUploadSerializer(serializers.Serializer):
+    """Загрузка картинки отдельно от рецепта.
+
+    Картинка сохраняется сразу, а в ответе возвращается подписанный
+    токен, который можно передать в поле image_token рецепта.
+    """
+    image = serializers.ImageField(write_only=True)
+    image_token = serializers.CharField(read_only=True)
+    image_url = serializers.CharField(read_only=True)
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        image = validated_data['image']
+        name = recipe_image_storage.save(
+            Recipe.image.field.generate_filename(None, image.name),
+            image,
+        )
+        return {
+            'image_token': signing.dumps(
+                {'name': name, 'user': user.id}, salt=IMAGE_TOKEN_SALT,
+            ),
+            'image_url': self.context['request'].build_absolute_uri(
+                recipe_image_storage.url(name)
+            ),
+        }
+
+
+def read_image_token(token, user):
+    """Имя файла из токена загрузки, выданного пользователю user."""
+    try:
+        data = signing.loads(
+            token,
+            salt=IMAGE_TOKEN_SALT,
+            max_age=settings.RECIPE_IMAGE_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        raise ValidationError({'image_token': 'Недействительный токен.'})
+    if (data['user'] != user.id
+            or not recipe_image_storage.exists(data['name'])):
+        raise ValidationError({'image_token': 'Недействительный токен.'})
+    return data['name']
 
 
 class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(use_url=True, max_length=None)
+    image = RecipeImageField(use_url=True, max_length=None, required=False)
+    image_token = serializers.CharField(write_only=True, required=False)
     author = UserSerializer(read_only=True)
     ingredients = IngredientQuantitySerializer(many=True)
     tags = serializers.PrimaryKeyRelatedField(
@@ -169,7 +274,7 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = (
-            'id', 'tags', 'author', 'ingredients', 'image',
+            'id', 'tags', 'author', 'ingredients', 'image', 'image_token',
             'name', 'text', 'cooking_time',
         )
 
@@ -209,6 +314,15 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 'Минимум 1 минута'
             )
+        token = data.pop('image_token', None)
+        if token:
+            data['image'] = read_image_token(
+                token, self.context['request'].user,
+            )
+        if not self.partial and not data.get('image'):
+            raise ValidationError(
+                {'image': 'Нужна картинка или image_token.'}
+            )
         return data
 
     @atomic
@@ -216,11 +330,19 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
         if 'ingredients' in validated_data:
             recipe = instance
             ingredients = validated_data.pop('ingredients')
+            cart_user_ids = list(
+                recipe.cart_recipe.values_list('user_id', flat=True)
+            )
+            # Удаление вычитает старые количества сигналами, а bulk_create
+            # сигналов не вызывает, поэтому новые прибавляются здесь.
             IngredientQuantity.objects.filter(current_recipe=recipe).delete()
             self.create_ingredients(recipe, ingredients)
+            ShoppingListItem.objects.add_recipe(recipe.id, cart_user_ids)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.for_read(request.user).get(pk=instance.pk)
         return ListRecipeSerializer(
             instance,
             context={
@@ -247,10 +369,11 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
 
 class RecipeShortShowSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('name', 'id', 'image', 'cooking_time')
+        fields = ('name', 'id', 'image', 'image_variants', 'cooking_time')
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
@@ -264,60 +387,20 @@ class SubscribeSerializer(serializers.ModelSerializer):
             'recipes', 'recipes_count', 'is_subscribed',
         )
 
-    def get_is_subscribed(self, obj: User):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(
-            following=request.user,
-            author=obj,
-        ).exists()
+    @staticmethod
+    def get_is_subscribed(obj: User):
+        return obj.is_subscribed
 
     def get_recipes(self, author):
-        queryset = self.context.get('request')
-        recipes_limit = queryset.query_params.get('recipes_limit')
-        if not recipes_limit:
-            return RecipeShortShowSerializer(
-                Recipe.objects.filter(author=author),
-                many=True,
-                context={'request': queryset},
-            ).data
         return RecipeShortShowSerializer(
-            Recipe.objects.filter(author=author)[:int(recipes_limit)],
+            author.recipes_preview,
             many=True,
-            context={'request': queryset},
+            context=self.context,
         ).data
 
-    def get_recipes_count(self, author):
-        return author.recipes.all().count()
-
-
-class SubscribeCreateSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Subscribe
-        fields = ('following', 'author')
-
-    def validate(self, data):
-        get_object_or_404(User, username=data['author'])
-        if self.context['request'].following == data['author']:
-            raise ValidationError({
-                'errors': 'Нельзя подписаться на самого себя.'
-            })
-        if Subscribe.objects.filter(
-                following=self.context['request'].following,
-                author=data['author'],
-        ):
-            raise ValidationError({
-                'errors': 'Уже подписан.'
-            })
-        return data
-
-    def to_representation(self, instance):
-        """Метод вывода данных."""
-        return SubscribeSerializer(
-            instance.author,
-            context={'request': self.context.get('request')},
-        ).data
+    @staticmethod
+    def get_recipes_count(author):
+        return author.recipes_count
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
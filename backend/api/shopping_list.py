@@ -0,0 +1,174 @@
+"""Выгрузка списка покупок в разных форматах."""
+import csv
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from foodgram.metrics import record_cache
+from rest_framework import renderers
+
+from recipes.models import ShoppingListItem
+from recipes.versions import CART_VERSION, INGREDIENTS_VERSION, get_version
+
+TITLE = 'Список покупок'
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+def get_shopping_list(user):
+    """Суммарное количество ингредиентов из списка покупок пользователя.
+
+    Результат кешируется до изменения списка покупок пользователя,
+    ингредиентов его рецептов или справочника ингредиентов.
+    """
+    key = 'shopping_list:{}:{}:{}'.format(
+        user.id,
+        get_version(CART_VERSION.format(user_id=user.id)),
+        get_version(INGREDIENTS_VERSION),
+    )
+    shopping_list = cache.get(key)
+    record_cache('shopping_list', shopping_list is not None)
+    if shopping_list is None:
+        shopping_list = list(ShoppingListItem.objects.filter(
+            user=user,
+        ).values_list(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'total',
+        ).order_by(
+            'ingredient__name',
+        ))
+        cache.set(key, shopping_list, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return shopping_list
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Основа рендереров списка покупок.
+
+    Сам список отдаётся потоком через stream(), а render() нужен DRF
+    только для ответов с ошибками.
+    """
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def stream(self, shopping_list):
+        raise NotImplementedError
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, shopping_list):
+        yield f'{TITLE}:\n'
+        for name, measurement_unit, amount in shopping_list:
+            yield f'{name}: {amount} {measurement_unit}\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, shopping_list):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for name, measurement_unit, amount in shopping_list:
+            yield writer.writerow((name, amount, measurement_unit))
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    extension = 'json'
+
+    def stream(self, shopping_list):
+        yield '['
+        for number, (name, measurement_unit, amount) in enumerate(
+            shopping_list,
+        ):
+            yield ',' * bool(number) + json.dumps({
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            }, ensure_ascii=False)
+        yield ']'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    extension = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.PDF_FONT_PATH),
+            )
+        return self.font_name
+
+    def stream(self, shopping_list):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle(TITLE)
+        font = self.get_font()
+        line_height = self.font_size * 1.5
+        y = A4[1] - self.margin
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, y, TITLE)
+        y -= line_height * 2
+        pdf.setFont(font, self.font_size)
+        for name, measurement_unit, amount in shopping_list:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = A4[1] - self.margin
+            pdf.drawString(
+                self.margin, y, f'• {name}: {amount} {measurement_unit}',
+            )
+            y -= line_height
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_RENDERERS = (
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+    PDFShoppingListRenderer,
+)
+
+
+def shopping_list_response(user, renderer):
+    response = StreamingHttpResponse(
+        renderer.stream(get_shopping_list(user)),
+        content_type=(
+            f'{renderer.media_type}; charset={renderer.charset}'
+            if renderer.charset else renderer.media_type
+        ),
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping_list.{renderer.extension}'
+    )
+    return response
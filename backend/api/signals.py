@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_user_cache
+from recipes.models import User
+
+
+def forget_tokens(keys):
+    # Повтор после коммита: иначе параллельный запрос может успеть
+    # положить в кеш пользователя, прочитанного до коммита.
+    token_user_cache.delete(keys)
+    transaction.on_commit(lambda: token_user_cache.delete(keys))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    keys = list(Token.objects.filter(
+        user_id=instance.pk,
+    ).values_list('key', flat=True))
+    if keys:
+        forget_tokens(keys)
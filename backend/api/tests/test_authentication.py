@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.authentication import (CACHED_USER_FIELDS,
+                                ClaimsTokenObtainPairSerializer,
+                                StatelessJWTAuthentication, token_user_cache)
+from recipes.models import User
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class TokenUserCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='old-pass',
+            is_staff=True,
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_user_cache.delete([self.token.key])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_shared_cache_keeps_only_public_fields(self):
+        user = token_user_cache.get(self.token.key)
+        self.assertEqual((user.pk, user.is_staff), (self.user.pk, True))
+        self.assertEqual(user.password, '')
+        cached = cache.get(token_user_cache.get_cache_key(self.token.key))
+        self.assertEqual(set(cached), set(CACHED_USER_FIELDS))
+
+    def test_write_reads_user_with_password_from_database(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': 'old-pass', 'new_password': 'N3w-pass!',
+            })
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('N3w-pass!'))
+        self.assertEqual(self.user.email, 'user@example.com')
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def test_user_from_token_keeps_permission_flags(self):
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com',
+            is_staff=True, is_superuser=True,
+        )
+        access = ClaimsTokenObtainPairSerializer.get_token(admin).access_token
+        request = APIRequestFactory().get(
+            '/api/users/me/', HTTP_AUTHORIZATION=f'Bearer {access}',
+        )
+        with self.assertNumQueries(0):
+            user, _token = StatelessJWTAuthentication().authenticate(request)
+        self.assertEqual(user.pk, admin.pk)
+        self.assertTrue(user.is_staff)
+        self.assertTrue(user.is_superuser)
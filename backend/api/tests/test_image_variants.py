@@ -0,0 +1,54 @@
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.images import build_variants
+from recipes.models import ImageBlob, Recipe, User
+from recipes.versions import CATALOG_VERSION, get_version
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+VARIANTS = {'card': 'cache/aa/card.jpg', 'card_webp': 'cache/aa/card.webp'}
+
+
+@override_settings(CACHES=CACHES)
+class BuildVariantsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@example.com',
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', image='recipes/test.jpg',
+            cooking_time=5, text='Описание',
+        )
+
+    def build_variants(self):
+        with mock.patch(
+            'recipes.images.make_variants', return_value=VARIANTS,
+        ), mock.patch.object(FileSystemStorage, 'exists', return_value=True):
+            build_variants(self.recipe.id, self.recipe.image.name)
+
+    def test_cached_detail_sees_variants_without_catalog_bump(self):
+        client = APIClient()
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertEqual(client.get(url).json()['image_variants'], {})
+        catalog = get_version(CATALOG_VERSION)
+        self.build_variants()
+        self.assertEqual(get_version(CATALOG_VERSION), catalog)
+        self.assertEqual(
+            set(client.get(url).json()['image_variants']), set(VARIANTS),
+        )
+
+    def test_variant_refs_follow_recipe(self):
+        self.build_variants()
+        self.build_variants()
+        refs = ImageBlob.objects.filter(name__in=VARIANTS.values())
+        self.assertEqual(sorted(refs.values_list('refs', flat=True)), [1, 1])
+        Recipe.objects.get(pk=self.recipe.pk).delete()
+        self.assertEqual(sorted(refs.values_list('refs', flat=True)), [0, 0])
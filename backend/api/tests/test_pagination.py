@@ -0,0 +1,57 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, User
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class CountCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='user', email='user@example.com',
+        )
+        cls.author = User.objects.create(
+            username='author', email='author@example.com',
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', image='recipes/test.jpg',
+            cooking_time=5, text='Описание',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cart_list_sees_recipe_added_after_first_request(self):
+        url = '/api/recipes/?is_in_shopping_cart=1'
+        data = self.client.get(url).json()
+        self.assertEqual((data['count'], data['results']), (0, []))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            )
+        self.assertEqual(response.status_code, 201)
+        data = self.client.get(url).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']], [self.recipe.id],
+        )
+
+    def test_subscriptions_list_sees_new_subscription(self):
+        url = '/api/users/subscriptions/'
+        self.assertEqual(self.client.get(url).json()['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/users/{self.author.id}/subscribe/',
+            )
+        self.assertEqual(response.status_code, 201)
+        data = self.client.get(url).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['id'], self.author.id)
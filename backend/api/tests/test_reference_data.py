@@ -0,0 +1,48 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Tag
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class ReferenceDataTests(TestCase):
+    url = '/api/tags/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_gzip_and_identity_have_different_etags(self):
+        identity = self.client.get(self.url)
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertNotEqual(identity['ETag'], gzipped['ETag'])
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=identity['ETag'],
+            HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_none_match_compares_whole_etags(self):
+        etag = self.client.get(self.url)['ETag']
+        for header, status in (
+            (etag, 304),
+            (f'"other", W/{etag}', 304),
+            ('*', 304),
+            (f'x{etag}', 200),
+            (f'"x{etag[1:]}', 200),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(
+                    self.url, HTTP_IF_NONE_MATCH=header,
+                )
+                self.assertEqual(response.status_code, status)
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
 
 app_name = 'api'
@@ -11,8 +13,32 @@ v1_router.register('tags', TagViewSet, basename='tags')
 v1_router.register('recipes', RecipeViewSet, basename='recipes')
 v1_router.register('users', UserViewSet, basename='users')
 
+async_urlpatterns = [
+    path('recipes/', async_views.recipe_list, name='async-recipes-list'),
+    path(
+        'recipes/<int:pk>/',
+        async_views.recipe_detail,
+        name='async-recipes-detail',
+    ),
+    path('tags/', async_views.tag_list, name='async-tags-list'),
+    path(
+        'ingredients/',
+        async_views.ingredient_list,
+        name='async-ingredients-list',
+    ),
+    path(
+        'users/subscriptions/',
+        async_views.subscriptions,
+        name='async-users-subscriptions',
+    ),
+]
+
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(v1_router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.AUTH_JWT:
+    urlpatterns.append(path('auth/', include('djoser.urls.jwt')))
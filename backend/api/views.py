@@ -1,27 +1,73 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from .conditional import ConditionalGetMixin
 from .filters import IngredientSearchFilter, RecipeFilter
+from .ingredient_index import ingredient_index
 from .pagination import CustomPagination
+from .parsers import RecipeMultiPartParser, TemporaryFileMultiPartParser
+from .reference_data import ingredients_blob, tags_blob
+from .response_cache import AnonymousCacheMixin
 from .serializers import (CreateUpdateRecipeSerializer, FavoriteSerializer,
                           IngredientSerializer, ListRecipeSerializer,
-                          ShoppingCartSerializer, SubscribeCreateSerializer,
+                          RecipeImageUploadSerializer, ShoppingCartSerializer,
                           SubscribeSerializer, TagSerializer)
-from recipes.models import (Favorite, Ingredient, IngredientQuantity, Recipe,
-                            ShoppingCart, Tag, User)
+from .shopping_list import SHOPPING_LIST_RENDERERS, shopping_list_response
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart, Tag,
+                            User)
+from recipes.versions import RECIPE_VERSION
 from users.models import Subscribe
 
 
+def is_reference_request(request):
+    """Запрос всего справочника в JSON, который отдаётся готовыми байтами."""
+    return (
+        not request.query_params
+        and request.accepted_renderer.format == 'json'
+    )
+
+
 class UserViewSet(viewsets.GenericViewSet):
     queryset = User.objects.all()
     pagination_class = CustomPagination
     serializer_class = SubscribeSerializer
+    cursor_ordering = ('username', 'id')
+
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        try:
+            recipes_limit = int(recipes_limit)
+        except (TypeError, ValueError):
+            return settings.SUBSCRIPTION_RECIPES_LIMIT_MAX
+        return max(
+            0,
+            min(recipes_limit, settings.SUBSCRIPTION_RECIPES_LIMIT_MAX),
+        )
+
+    def get_subscriptions_queryset(self):
+        return User.objects.annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Exists(
+                Subscribe.objects.filter(
+                    following=self.request.user,
+                    author=OuterRef('pk'),
+                )
+            ),
+        ).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=Recipe.objects.all()[:self.get_recipes_limit()],
+                to_attr='recipes_preview',
+            ),
+        ).order_by('username')
 
     @action(
         detail=True,
@@ -41,9 +87,9 @@ class UserViewSet(viewsets.GenericViewSet):
                 {'errors': 'Вы уже подписаны на пользователя'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        subscribe = Subscribe.objects.create(following=user, author=author)
-        serializer = SubscribeCreateSerializer(
-            subscribe,
+        Subscribe.objects.create(following=user, author=author)
+        serializer = SubscribeSerializer(
+            self.get_subscriptions_queryset().get(pk=author.pk),
             context={'request': request},
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -67,9 +113,10 @@ class UserViewSet(viewsets.GenericViewSet):
     )
     def subscriptions(self, request):
         result = self.paginate_queryset(
-            User.objects.filter(
+            self.get_subscriptions_queryset().filter(
                 following__following=request.user,
-        ))
+            )
+        )
         serializer = SubscribeSerializer(
             result,
             many=True,
@@ -78,27 +125,58 @@ class UserViewSet(viewsets.GenericViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     pagination_class = None
     serializer_class = IngredientSerializer
     filterset_class = IngredientSearchFilter
     search_fields = ('^name',)
 
+    def get_search_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit'))
+        except (TypeError, ValueError):
+            return settings.INGREDIENT_SEARCH_LIMIT
+        return max(1, min(limit, settings.INGREDIENT_SEARCH_LIMIT))
 
-class TagViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(
+                ingredient_index.search(name, self.get_search_limit())
+            )
+        if is_reference_request(request):
+            return ingredients_blob.response(request)
+        return super().list(request, *args, **kwargs)
+
+
+class TagViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     pagination_class = None
     serializer_class = TagSerializer
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        if is_reference_request(request):
+            return tags_blob.response(request)
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = CustomPagination
+    cursor_ordering = ('-pub_date', '-id')
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    parser_classes = (JSONParser, RecipeMultiPartParser)
     filterset_class = RecipeFilter
     search_fields = ('=name',)
+    cache_version_name = RECIPE_VERSION
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_read(self.request.user)
+        return Recipe.objects.with_user_flags(self.request.user)
 
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PUT', 'PATCH'):
@@ -134,6 +212,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
         favorites.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=('post', ),
+        permission_classes=(IsAuthenticated, ),
+        parser_classes=(TemporaryFileMultiPartParser, ),
+    )
+    def images(self, request):
+        serializer = RecipeImageUploadSerializer(
+            data=request.data,
+            context={'request': request},
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(
         detail=True,
         methods=('post', ),
@@ -151,10 +244,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=('post', ),
         permission_classes=(IsAuthenticated, ),
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
         return self.recipe_post_method(request, ShoppingCartSerializer, pk)
 
     @shopping_cart.mapping.delete
+    @transaction.atomic
     def delete_from_shopping_card(self, request, pk=None):
         return self.recipe_delete_method(request, ShoppingCart, pk)
 
@@ -162,25 +257,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=('get', ),
         permission_classes=(IsAuthenticated, ),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        shopping_cart = IngredientQuantity.objects.filter(
-            current_recipe__cart_recipe__user=request.user
-        ).values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit',
-        ).order_by(
-            'ingredient__name',
-        ).annotate(
-            ingredient_total=Sum('amount'),
-        )
-        text = 'Cписок покупок: \n'
-        for ingredients in shopping_cart:
-            name, measurement_unit, amount = ingredients
-            text += f'{name}: {amount} {measurement_unit}\n'
-        response = HttpResponse(text, content_type='text/plain')
-        filename = 'shoping_list.pdf'
-        response['Content-Disposition'] = (
-            f'attachment; filename={filename}'
-        )
-        return response
+        return shopping_list_response(request.user, request.accepted_renderer)
@@ -0,0 +1,132 @@
+"""Чтение с реплик базы с прилипанием к основной базе после записи."""
+import random
+from hashlib import sha1
+
+from asgiref.local import Local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+CATALOG_PIN = 'catalog'
+
+_state = Local()
+
+
+def get_pin_key(name):
+    return f'db-pin:{name}'
+
+
+def pin_to_primary(name):
+    """Направляет чтения name на основную базу REPLICA_PIN_SECONDS секунд."""
+    if settings.DATABASE_REPLICAS:
+        cache.set(get_pin_key(name), True, settings.REPLICA_PIN_SECONDS)
+
+
+def get_client_pin(request):
+    """Имя закрепления для клиента: по токену, сессии или адресу.
+
+    Адрес берётся из REPLICA_CLIENT_IP_HEADER: за прокси REMOTE_ADDR
+    у всех клиентов один, и запись одного анонима закрепляла бы всех.
+    """
+    credentials = (
+        request.headers.get('Authorization')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get(settings.REPLICA_CLIENT_IP_HEADER)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return 'client:' + sha1(credentials.encode()).hexdigest()
+
+
+class PrimaryReplicaRouter:
+    """Отправляет чтения на реплику, выбранную для текущего запроса.
+
+    Вне запросов (команды, фоновые потоки), внутри транзакций и для
+    моделей из REPLICA_EXCLUDED_MODELS используется основная база.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if (
+            replica is None
+            or model._meta.label_lower in settings.REPLICA_EXCLUDED_MODELS
+            or connections['default'].in_atomic_block
+        ):
+            return 'default'
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """Выбирает реплику для безопасных запросов.
+
+    После успешной записи клиент закрепляется за основной базой, и пока
+    действует его закрепление или закрепление каталога (см.
+    recipes.versions.bump_version), чтения тоже идут в основную базу.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def get_pin_keys(self, request):
+        return (
+            get_pin_key(get_client_pin(request)),
+            get_pin_key(CATALOG_PIN),
+        )
+
+    def should_pin(self, request, response):
+        return (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        if (
+            request.method in SAFE_METHODS
+            and not cache.get_many(self.get_pin_keys(request))
+        ):
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if self.should_pin(request, response):
+            pin_to_primary(get_client_pin(request))
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        if (
+            request.method in SAFE_METHODS
+            and not await cache.aget_many(self.get_pin_keys(request))
+        ):
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.replica = None
+        if self.should_pin(request, response):
+            await cache.aset(
+                get_pin_key(get_client_pin(request)),
+                True,
+                settings.REPLICA_PIN_SECONDS,
+            )
+        return response
@@ -0,0 +1,286 @@
+"""Метрики запросов в формате Prometheus без внешних сервисов.
+
+Каждый процесс копит значения у себя в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд записывает их в свой файл
+METRICS_DIR/<хост>-<pid>.json. Файл пишет только его процесс, поэтому
+блокировки не нужны ни между воркерами gunicorn, ни при чтении: эндпоинт
+метрик складывает файлы всех воркеров всех контейнеров с общим
+каталогом. Файлы остановленных воркеров удаляются: своего хоста - сразу,
+чужих - если не обновлялись METRICS_STALE_SECONDS секунд.
+"""
+import json
+import math
+import os
+import socket
+import time
+from collections import Counter
+from contextvars import ContextVar
+from glob import glob
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .performance import listen_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+METRICS = {
+    'foodgram_requests_total': (
+        'counter', 'Число HTTP-запросов.',
+    ),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Время ответа.',
+    ),
+    'foodgram_db_queries': (
+        'histogram', 'Число запросов к базе на HTTP-запрос.',
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кешам API: попадания и промахи.',
+    ),
+}
+
+current_request = ContextVar('metrics_request', default=None)
+HOSTNAME = socket.gethostname()
+
+
+def record_cache(name, hit):
+    """Отмечает попадание или промах кеша name в текущем запросе."""
+    request_metrics = current_request.get()
+    if request_metrics is not None:
+        request_metrics.caches[(name, 'hit' if hit else 'miss')] += 1
+
+
+class RequestMetrics:
+    """Запросы к базе и обращения к кешам одного HTTP-запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.caches = Counter()
+
+    def __call__(self, sql, params, duration):
+        self.queries += 1
+
+
+class WorkerMetrics:
+    """Счётчики и гистограммы текущего процесса."""
+
+    def __init__(self):
+        self.pid = None
+        self.values = Counter()
+        self.flushed = 0
+
+    def get_values(self):
+        # Процесс, созданный fork(), не должен досчитывать чужие значения
+        # и писать их в свой файл.
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.values = Counter()
+            self.flushed = 0
+        return self.values
+
+    def inc(self, name, labels, value=1):
+        self.get_values()[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets):
+        values = self.get_values()
+        for bound in buckets:
+            if value <= bound:
+                values[(f'{name}_bucket', labels + (('le', str(bound)),))] += 1
+        values[(f'{name}_bucket', labels + (('le', '+Inf'),))] += 1
+        values[(f'{name}_sum', labels)] += value
+        values[(f'{name}_count', labels)] += 1
+
+    def record(self, view, request, response, request_metrics):
+        labels = (('view', view),)
+        self.inc('foodgram_requests_total', labels + (
+            ('method', request.method),
+            ('status', str(response.status_code)),
+        ))
+        self.observe(
+            'foodgram_request_duration_seconds', labels,
+            time.perf_counter() - request_metrics.started, LATENCY_BUCKETS,
+        )
+        self.observe(
+            'foodgram_db_queries', labels,
+            request_metrics.queries, QUERY_BUCKETS,
+        )
+        for (name, result), count in request_metrics.caches.items():
+            self.inc(
+                'foodgram_cache_requests_total',
+                labels + (('cache', name), ('result', result)),
+                count,
+            )
+        if time.monotonic() - self.flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        values = self.get_values()
+        if not self.flushed:
+            remove_dead_files()
+        self.flushed = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = get_path(HOSTNAME, self.pid)
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(
+                [[name, labels, value] for (name, labels), value
+                 in values.items()],
+                file,
+            )
+        os.replace(f'{path}.tmp', path)
+
+
+worker_metrics = WorkerMetrics()
+
+
+def get_path(hostname, pid):
+    return os.path.join(settings.METRICS_DIR, f'{hostname}-{pid}.json')
+
+
+def parse_name(path):
+    """Хост и pid из имени файла или None для чужих файлов."""
+    hostname, _, pid = os.path.basename(path)[:-len('.json')].rpartition('-')
+    if not hostname or not pid.isdigit():
+        return None
+    return hostname, int(pid)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_dead(path):
+    """Файл остановленного воркера.
+
+    Живость pid проверяется только на своём хосте: у других контейнеров
+    свои номера процессов, их файлы считаются брошенными, если долго
+    не обновлялись. Номер умершего воркера может достаться новому, тогда
+    тот перезапишет файл своими значениями.
+    """
+    name = parse_name(path)
+    if name is None:
+        return False
+    hostname, pid = name
+    if hostname == HOSTNAME:
+        return not is_alive(pid)
+    try:
+        modified = os.path.getmtime(path)
+    except FileNotFoundError:
+        return False
+    return time.time() - modified > settings.METRICS_STALE_SECONDS
+
+
+def remove_dead_files():
+    for path in glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        if is_dead(path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def collect():
+    """Сумма значений всех живых воркеров по (имя, метки)."""
+    remove_dead_files()
+    totals = Counter()
+    for path in glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as file:
+                values = json.load(file)
+        except (FileNotFoundError, ValueError):
+            continue
+        for name, labels, value in values:
+            totals[(name, tuple(map(tuple, labels)))] += value
+    return totals
+
+
+def get_metric_name(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def format_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"'),
+        )
+        for name, value in labels
+    )
+
+
+def render(totals):
+    """Текстовый формат Prometheus 0.0.4."""
+    series = {name: [] for name in METRICS}
+    for (name, labels), value in totals.items():
+        series.setdefault(get_metric_name(name), []).append(
+            (name, labels, value),
+        )
+    lines = []
+    for metric, rows in series.items():
+        kind, description = METRICS.get(metric, ('untyped', ''))
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, labels, value in sorted(rows, key=sort_key):
+            lines.append(f'{name}{{{format_labels(labels)}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def sort_key(row):
+    name, labels, _value = row
+    labels = dict(labels)
+    bound = labels.pop('le', None)
+    return (
+        name,
+        sorted(labels.items()),
+        math.inf if bound in (None, '+Inf') else float(bound),
+    )
+
+
+class MetricsMiddleware:
+    """Считает запросы, время ответа, запросы к базе и обращения к кешам
+    по имени маршрута DRF (recipes-list, users-subscriptions, ...)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        try:
+            with listen_queries(request_metrics):
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, request_metrics)
+        return response
+
+    async def __acall__(self, request):
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        try:
+            with listen_queries(request_metrics):
+                response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, request_metrics)
+        return response
+
+    def record(self, request, response, request_metrics):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        worker_metrics.record(view, request, response, request_metrics)
@@ -0,0 +1,163 @@
+"""Поиск N+1: одинаковых запросов к базе, повторённых за один HTTP-запрос."""
+import json
+import logging
+import os
+import random
+import re
+import sys
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.serializers import Serializer
+
+from .performance import get_view_name, listen_queries
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+NUMBER = re.compile(r'\b\d+\b')
+WHITESPACE = re.compile(r'\s+')
+# Middleware и настройки проекта: их кадры есть в стеке любого запроса.
+IGNORED_DIR = os.path.dirname(__file__)
+SERIALIZER_LOOPS = ('to_representation', 'to_internal_value')
+
+
+class NPlusOneError(Exception):
+    """Повторяющиеся запросы при NPLUSONE_MODE = 'raise'."""
+
+
+def normalize_sql(sql):
+    """SQL без чисел и с одинаковыми списками IN любой длины."""
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = NUMBER.sub('?', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def is_project_file(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and not filename.startswith(IGNORED_DIR)
+    )
+
+
+def get_origin(frame):
+    """Поле сериализатора и строка кода проекта, откуда пришёл запрос.
+
+    Поле берётся из ближайшего to_representation или to_internal_value
+    сериализатора: там DRF обходит поля в переменной field, поэтому
+    видно, какой SerializerMethodField, связанный менеджер или
+    PrimaryKeyRelatedField сделал запрос.
+    """
+    location = None
+    while frame is not None:
+        code = frame.f_code
+        if location is None and is_project_file(code.co_filename):
+            location = '{}:{} ({})'.format(
+                os.path.relpath(code.co_filename, settings.BASE_DIR),
+                frame.f_lineno,
+                code.co_name,
+            )
+        if code.co_name in SERIALIZER_LOOPS:
+            serializer = frame.f_locals.get('self')
+            field = frame.f_locals.get('field')
+            if isinstance(serializer, Serializer) and field is not None:
+                name = f'{type(serializer).__name__}.{field.field_name}'
+                if location:
+                    name = f'{name} в {location}'
+                return name
+        frame = frame.f_back
+    return location or 'неизвестно'
+
+
+class QueryGroups:
+    """Запросы одного HTTP-запроса, сгруппированные по нормализованному SQL."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, sql, params, duration):
+        key = normalize_sql(sql)
+        self.counts[key] += 1
+        self.origins[key][get_origin(sys._getframe(1))] += 1
+
+    def get_repeats(self, threshold):
+        return [
+            {
+                'sql': sql,
+                'count': count,
+                'origins': dict(self.origins[sql].most_common()),
+            }
+            for sql, count in self.counts.most_common()
+            if count >= threshold
+        ]
+
+
+def format_repeats(repeats):
+    lines = []
+    for repeat in repeats:
+        lines.append(f'{repeat["count"]} x {repeat["sql"]}')
+        for origin, count in repeat['origins'].items():
+            lines.append(f'    {count} x {origin}')
+    return '\n'.join(lines)
+
+
+class NPlusOneMiddleware:
+    """Ищет повторы одного запроса к базе не меньше NPLUSONE_THRESHOLD раз.
+
+    NPLUSONE_MODE: 'raise' - проверяет каждый запрос и бросает
+    NPlusOneError (для тестов), 'log' - проверяет долю запросов
+    NPLUSONE_SAMPLE_RATE и пишет найденное в лог foodgram.nplusone,
+    'off' - выключено.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def is_checked(self):
+        mode = settings.NPLUSONE_MODE
+        if mode == 'raise':
+            return True
+        rate = settings.NPLUSONE_SAMPLE_RATE
+        return mode == 'log' and rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_checked():
+            return self.get_response(request)
+        groups = QueryGroups()
+        with listen_queries(groups):
+            response = self.get_response(request)
+        self.report(request, groups)
+        return response
+
+    async def __acall__(self, request):
+        if not self.is_checked():
+            return await self.get_response(request)
+        groups = QueryGroups()
+        with listen_queries(groups):
+            response = await self.get_response(request)
+        self.report(request, groups)
+        return response
+
+    def report(self, request, groups):
+        repeats = groups.get_repeats(settings.NPLUSONE_THRESHOLD)
+        if not repeats:
+            return
+        view = get_view_name(request)
+        if settings.NPLUSONE_MODE == 'raise':
+            raise NPlusOneError(
+                f'Повторяющиеся запросы в {view} ({request.path}):\n'
+                + format_repeats(repeats)
+            )
+        logger.warning(json.dumps(
+            {'view': view, 'path': request.path, 'repeats': repeats},
+            ensure_ascii=False,
+        ))
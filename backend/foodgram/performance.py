@@ -0,0 +1,177 @@
+"""Замеры времени запросов: база, view, рендеринг, размер ответа."""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Соединения с базой у каждого потока свои, а запросы асинхронных view
+# выполняются в общем потоке sync_to_async, поэтому слушатели запросов
+# хранятся в контексте, который sync_to_async копирует в поток.
+query_listeners = ContextVar('query_listeners', default=())
+
+
+def record_query(execute, sql, params, many, context):
+    listeners = query_listeners.get()
+    if not listeners:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for listener in listeners:
+            listener(sql, params, duration)
+
+
+@contextmanager
+def listen_queries(listener):
+    """Вызывает listener(sql, params, duration) для запросов к базе."""
+    token = query_listeners.set(query_listeners.get() + (listener,))
+    try:
+        yield
+    finally:
+        query_listeners.reset(token)
+
+
+@receiver(connection_created)
+def install_query_wrapper(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def get_view_name(request):
+    """Имя view вида RecipeViewSet.list или api.async_views.tag_list."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = match.func
+    view_class = getattr(view, 'cls', None)
+    if view_class is None:
+        return match._func_path
+    actions = getattr(view, 'actions', None) or {}
+    method = request.method.lower()
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+def get_response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length else None
+
+
+class RequestStats:
+    """Запросы к базе и время этапов одного HTTP-запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.db_time = 0
+        self.render_started = None
+        self.render_time = 0
+
+    def __call__(self, sql, params, duration):
+        self.db_time += duration
+        self.queries[(sql, str(params))] += 1
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        self.render_time = time.perf_counter() - self.render_started
+
+    def get_data(self, request, response):
+        total = time.perf_counter() - self.started
+        return {
+            'view': get_view_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': sum(self.queries.values()),
+            'duplicate_queries': sum(
+                count - 1 for count in self.queries.values() if count > 1
+            ),
+            'db_ms': round(self.db_time * 1000, 2),
+            'app_ms': round(
+                (total - self.db_time - self.render_time) * 1000, 2,
+            ),
+            'render_ms': round(self.render_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'bytes': get_response_size(response),
+        }
+
+
+def get_server_timing(data):
+    return ', '.join((
+        f'db;dur={data["db_ms"]};desc="{data["queries"]} queries"',
+        f'app;dur={data["app_ms"]}',
+        f'render;dur={data["render_ms"]}',
+        f'total;dur={data["total_ms"]}',
+    ))
+
+
+class PerformanceMiddleware:
+    """Замеряет PERFORMANCE_SAMPLE_RATE долю запросов.
+
+    Для выбранных запросов добавляет заголовок Server-Timing и пишет
+    в лог foodgram.performance строку JSON. Время рендеринга DRF
+    замеряется от process_template_response до конца render(),
+    app - время view без базы, то есть в основном сериализация.
+    Остальные запросы обходятся в одно обращение к random().
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for alias in connections:
+            install_query_wrapper(connections[alias])
+
+    def is_sampled(self):
+        rate = settings.PERFORMANCE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_sampled():
+            return self.get_response(request)
+        request._performance = stats = RequestStats()
+        with listen_queries(stats):
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+        request._performance = stats = RequestStats()
+        with listen_queries(stats):
+            response = await self.get_response(request)
+        return self.report(request, response, stats)
+
+    def process_template_response(self, request, response):
+        stats = getattr(request, '_performance', None)
+        if stats is not None:
+            stats.start_render()
+            response.add_post_render_callback(stats.finish_render)
+        return response
+
+    def report(self, request, response, stats):
+        data = stats.get_data(request, response)
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = get_server_timing(data)
+        logger.info(json.dumps(data, ensure_ascii=False))
+        return response
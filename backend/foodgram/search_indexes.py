@@ -0,0 +1,99 @@
+"""Индексы для поиска по началу и части строки без учёта регистра.
+
+Индекс для istartswith описывается в Meta.indexes моделей классом
+PrefixSearchIndex, поэтому Django знает о нём и пересоздаёт вместе
+с таблицей SQLite при AlterField. Триграммные индексы для icontains есть
+только в PostgreSQL, их создают миграции SQL-запросами отсюда.
+"""
+from django.db import migrations, models
+from django.db.backends.ddl_references import Columns, Statement, Table
+
+PREFIX_SQL = {
+    'postgresql': (
+        'CREATE INDEX %(name)s ON %(table)s '
+        '(UPPER(%(columns)s::text) text_pattern_ops)'
+    ),
+    'sqlite': (
+        'CREATE INDEX %(name)s ON %(table)s (%(columns)s COLLATE NOCASE)'
+    ),
+}
+CREATE_SQL = {
+    'postgresql': (
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_{column}_upper_trgm '
+        'ON {table} USING gin (UPPER({column}) gin_trgm_ops)',
+    ),
+}
+DROP_SQL = {
+    'postgresql': (
+        'DROP INDEX CONCURRENTLY IF EXISTS {table}_{column}_upper_trgm',
+    ),
+}
+# Индексы для istartswith, которые раньше создавались SQL-запросами.
+LEGACY_PREFIX_DROP_SQL = {
+    'postgresql': (
+        'DROP INDEX CONCURRENTLY IF EXISTS {table}_{column}_upper_like',
+    ),
+    'sqlite': (
+        'DROP INDEX IF EXISTS {table}_{column}_nocase',
+    ),
+}
+
+
+class PrefixSearchIndex(models.Index):
+    """Индекс одной колонки для istartswith.
+
+    В PostgreSQL строится по UPPER(колонка) с text_pattern_ops, как
+    Django записывает istartswith, в SQLite - по колонке с COLLATE
+    NOCASE, который использует LIKE. Для других баз - обычный индекс.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        template = PREFIX_SQL.get(schema_editor.connection.vendor)
+        if template is None:
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        table = model._meta.db_table
+        return Statement(
+            template,
+            table=Table(table, schema_editor.quote_name),
+            name=schema_editor.quote_name(self.name),
+            columns=Columns(
+                table,
+                [model._meta.get_field(self.fields[0]).column],
+                schema_editor.quote_name,
+            ),
+        )
+
+
+def run_for_vendor(indexes, statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for table, column in indexes:
+            for sql in statements.get(vendor, ()):
+                schema_editor.execute(sql.format(table=table, column=column))
+    return run
+
+
+def create_search_indexes(indexes, reversible=True):
+    """Операция миграции для индексов indexes = ((таблица, колонка), ...).
+
+    Миграция с ней должна быть atomic = False: PostgreSQL не строит
+    индексы CONCURRENTLY внутри транзакции.
+    """
+    return migrations.RunPython(
+        run_for_vendor(indexes, CREATE_SQL),
+        run_for_vendor(indexes, DROP_SQL)
+        if reversible else migrations.RunPython.noop,
+    )
+
+
+def drop_legacy_prefix_indexes(indexes):
+    """Удаляет индексы для istartswith, созданные SQL-запросами.
+
+    Их заменяет PrefixSearchIndex; миграция тоже должна быть
+    atomic = False.
+    """
+    return migrations.RunPython(
+        run_for_vendor(indexes, LEGACY_PREFIX_DROP_SQL),
+        migrations.RunPython.noop,
+    )
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -31,6 +33,37 @@ else:
         }
     }
 
+# Реплики для чтения: пути к файлам SQLite при DEBUG, иначе host[:port]
+# серверов PostgreSQL через пробел.
+DATABASE_REPLICAS = []
+for number, location in enumerate(os.getenv('DB_REPLICAS', '').split(), 1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if DEBUG:
+        replica['NAME'] = location
+    else:
+        replica['HOST'], _, port = location.partition(':')
+        replica['PORT'] = port or replica['PORT']
+    DATABASES[f'replica{number}'] = replica
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+    database['CONN_HEALTH_CHECKS'] = True
+
+DATABASE_ROUTERS = ['foodgram.db_router.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+REPLICA_CLIENT_IP_HEADER = os.getenv(
+    'REPLICA_CLIENT_IP_HEADER', default='REMOTE_ADDR',
+)
+REPLICA_EXCLUDED_MODELS = ('authtoken.token', 'sessions.session')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),  # noqa
+        'LOCATION': os.getenv('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')),  # noqa
+    }
+}
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -53,7 +86,11 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
+    'foodgram.performance.PerformanceMiddleware',
+    'foodgram.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -109,9 +146,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+PDF_FONT_PATH = os.getenv('PDF_FONT_PATH', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')  # noqa
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': (
         ('rest_framework.permissions.AllowAny', )
@@ -136,6 +175,55 @@ DJOSER = {
     },
 }
 
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60 * 5))
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', 10))
+AUTH_TOKEN_LOCAL_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_SIZE', 10_000))
+AUTH_JWT = os.getenv('AUTH_JWT') == 'True'
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 5)),
+    ),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',  # noqa
+}
+if AUTH_JWT:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].append(
+        'api.authentication.StatelessJWTAuthentication',
+    )
+
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', 0.01))
+PERFORMANCE_SERVER_TIMING = os.getenv(
+    'PERFORMANCE_SERVER_TIMING', default='True',
+) == 'True'
+NPLUSONE_MODE = os.getenv('NPLUSONE_MODE', default='log')
+NPLUSONE_SAMPLE_RATE = float(os.getenv('NPLUSONE_SAMPLE_RATE', 0.01))
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics'),
+)
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+METRICS_STALE_SECONDS = int(os.getenv('METRICS_STALE_SECONDS', 60 * 60))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        'foodgram.nplusone': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CSRF_TRUSTED_ORIGINS = ['http://127.0.0.1', 'http://localhost']
 
@@ -153,3 +241,28 @@ TAG_COLOR_MAX_LENGTH = 7
 RECIPE_NAME_MAX_LENGTH = 200
 RECIPE_COOKING_TIME_MIN_LENGTH = 1
 INGREDIENT_IN_RECIPE_MIN_LENGTH = 1
+SUBSCRIPTION_RECIPES_LIMIT_MAX = 20
+INGREDIENT_SEARCH_LIMIT = 50
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100_000)
+)
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60 * 10))
+REFERENCE_DATA_MAX_AGE = int(os.getenv('REFERENCE_DATA_MAX_AGE', 60 * 60))
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_VARIANTS = {
+    'card': ('480x320', {'crop': 'center'}),
+    'detail': ('960x640', {'upscale': False}),
+}
+RECIPE_IMAGE_TOKEN_MAX_AGE = int(os.getenv('RECIPE_IMAGE_TOKEN_MAX_AGE', 60 * 60))
+MEDIA_GC_PATHS = ('recipes', 'cache')
+MEDIA_GC_MIN_AGE = int(os.getenv('MEDIA_GC_MIN_AGE', 60 * 60 * 24))
+MEDIA_GC_QUARANTINE_DIR = os.getenv(
+    'MEDIA_GC_QUARANTINE_DIR', os.path.join(BASE_DIR, 'media_quarantine'),
+)
+MEDIA_GC_STATE_FILE = os.getenv(
+    'MEDIA_GC_STATE_FILE', os.path.join(BASE_DIR, 'media_gc_state.json'),
+)
@@ -3,8 +3,10 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
+from foodgram.views import metrics_view
 
 urlpatterns = [
+    path('admin/metrics/', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path(
@@ -0,0 +1,22 @@
+from django.http import HttpResponse
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import (api_view, authentication_classes,
+                                       permission_classes)
+from rest_framework.permissions import IsAdminUser
+from rest_framework.settings import api_settings
+
+from .metrics import collect, render, worker_metrics
+
+
+@api_view(['GET'])
+@authentication_classes(
+    [SessionAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+)
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Метрики всех воркеров в текстовом формате Prometheus."""
+    worker_metrics.flush()
+    return HttpResponse(
+        render(collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
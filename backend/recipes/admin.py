@@ -51,7 +51,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'cooking_time', 'id', 'image',
     )
     list_display_links = ('name',)
-    search_fields = ('name', 'author', 'tags')
+    search_fields = ('name', 'author__username')
     list_filter = ('author', 'name', 'tags')
     filter_horizontal = ('tags',)
     inlines = (IngredientQuantityInLine,)
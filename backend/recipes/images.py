@@ -0,0 +1,117 @@
+"""Фоновая подготовка уменьшенных копий картинок рецептов."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from .versions import RECIPE_VERSION, bump_version
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (
+    ('', {'format': 'JPEG', 'quality': 85}),
+    ('_webp', {'format': 'WEBP', 'quality': 80}),
+)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def make_variants(image):
+    """Создаёт копии картинки для всех размеров и форматов.
+
+    Возвращает словарь {вариант: путь в хранилище}, например
+    {'card': ..., 'card_webp': ..., 'detail': ..., 'detail_webp': ...}.
+    """
+    files = {}
+    for name, (geometry, options) in settings.RECIPE_IMAGE_VARIANTS.items():
+        for suffix, image_format in FORMATS:
+            files[f'{name}{suffix}'] = get_thumbnail(
+                image, geometry, **options, **image_format,
+            ).name
+    return files
+
+
+def get_variant_files(variants):
+    """Пути копий из значения Recipe.image_variants."""
+    return list((variants or {}).get('files', {}).values())
+
+
+def build_variants(recipe_id, image_name):
+    """Готовит варианты картинки и сохраняет их пути в рецепт.
+
+    Если за это время картинку рецепта заменили, результат не
+    записывается: новую картинку обработает своя задача. Ссылки
+    в ImageBlob переносятся со старых копий на новые в той же
+    транзакции, что и запись путей.
+
+    Сдвигается только версия рецепта: его страница обновится сразу,
+    а закешированные списки до RESPONSE_CACHE_TIMEOUT показывают
+    исходную картинку, как до обработки.
+    """
+    from .models import ImageBlob, Recipe
+
+    try:
+        recipes = Recipe.objects.filter(pk=recipe_id, image=image_name)
+        recipe = recipes.first()
+        if recipe is None or not recipe.image.storage.exists(image_name):
+            return
+        files = make_variants(recipe.image)
+        with transaction.atomic():
+            # Транзакция начинается с записи: в SQLite транзакция, начатая
+            # чтением, не дожидается блокировки, если пишет другой поток.
+            ImageBlob.objects.change_refs(files.values(), 1)
+            old_variants = recipes.select_for_update().values_list(
+                'image_variants', flat=True,
+            ).first()
+            if old_variants is None:
+                transaction.set_rollback(True)
+                return
+            recipes.update(
+                image_variants={'source': image_name, 'files': files},
+                updated_at=timezone.now(),
+            )
+            ImageBlob.objects.change_refs(
+                get_variant_files(old_variants), -1,
+            )
+        bump_version(RECIPE_VERSION.format(pk=recipe_id))
+    except Exception:
+        logger.exception(
+            'Не удалось обработать картинку рецепта %s', recipe_id,
+        )
+
+
+def build_variants_in_worker(recipe_id, image_name):
+    try:
+        build_variants(recipe_id, image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    """Ставит обработку картинки в очередь после коммита транзакции.
+
+    При RECIPE_IMAGE_WORKERS = 0 картинка обрабатывается сразу
+    после коммита в текущем потоке.
+    """
+    image_name = recipe.image.name
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(
+            build_variants_in_worker, recipe.pk, image_name,
+        ))
+    else:
+        transaction.on_commit(
+            lambda: build_variants(recipe.pk, image_name),
+        )
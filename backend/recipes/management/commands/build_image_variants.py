@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants, build_variants_in_worker
+from recipes.models import Recipe
+from recipes.versions import CATALOG_VERSION, bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит уменьшенные копии картинок для рецептов, у которых их '
+        'ещё нет, например после загрузки данных в обход API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии для всех рецептов.',
+        )
+        parser.add_argument('--workers', type=int, default=1)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        tasks = [
+            (pk, image)
+            for pk, image, variants in Recipe.objects.values_list(
+                'pk', 'image', 'image_variants',
+            ).iterator()
+            if image and (options['all'] or variants.get('source') != image)
+        ]
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(options['workers']) as executor:
+                list(executor.map(
+                    lambda task: build_variants_in_worker(*task), tasks,
+                ))
+        else:
+            for pk, image in tasks:
+                build_variants(pk, image)
+        if tasks:
+            # build_variants сдвигает только версии рецептов, а после
+            # массовой обработки кеши списков сбрасываются один раз.
+            bump_version(CATALOG_VERSION)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(tasks)} за '
+            f'{time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,193 @@
+import json
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sorl.thumbnail import default as thumbnail_default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from recipes.models import ImageBlob
+
+
+def split_path(path):
+    return tuple(path.split('/'))
+
+
+def walk(root, relative, after):
+    """Отдаёт (путь, DirEntry) файлов в порядке сортировки путей.
+
+    Пути сравниваются по компонентам, поэтому каталоги, целиком
+    лежащие до after, пропускаются без чтения.
+    """
+    try:
+        entries = sorted(
+            os.scandir(os.path.join(root, relative)),
+            key=lambda entry: entry.name,
+        )
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        path = f'{relative}/{entry.name}'
+        parts = split_path(path)
+        if entry.is_dir(follow_symlinks=False):
+            if parts >= after[:len(parts)]:
+                yield from walk(root, path, after)
+        elif entry.is_file(follow_symlinks=False) and parts > after:
+            yield path, entry
+
+
+def find_referenced(names):
+    """Файлы из names, на которые ссылается хотя бы один рецепт.
+
+    Счётчики ссылок ImageBlob на картинки и их уменьшенные копии ведут
+    сигналы рецептов и build_variants, а уникальный индекс по name
+    позволяет не просматривать таблицу рецептов.
+    """
+    return set(ImageBlob.objects.filter(
+        name__in=names, refs__gt=0,
+    ).values_list('name', flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        'Находит в MEDIA_ROOT картинки рецептов и их уменьшенные копии, '
+        'на которые не ссылается ни один рецепт, и переносит их в '
+        'карантин или удаляет. Обходит файлы пачками и запоминает, '
+        'где остановился.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--action', choices=('report', 'quarantine', 'delete'),
+            default='quarantine',
+            help='Что делать с ненужными файлами (по умолчанию quarantine).',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--limit', type=int, default=0,
+            help='Сколько файлов проверить за запуск, 0 - до конца обхода.',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=settings.MEDIA_GC_MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Повторять запуск раз в столько секунд.',
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Начать обход сначала.',
+        )
+
+    def handle(self, *args, **options):
+        if options['min_age'] < settings.RECIPE_IMAGE_TOKEN_MAX_AGE:
+            raise CommandError(
+                '--min-age меньше RECIPE_IMAGE_TOKEN_MAX_AGE: картинки, '
+                'загруженные по токену, будут удалены до сохранения рецепта.'
+            )
+        self.options = options
+        self.root = settings.MEDIA_ROOT
+        self.thumbnail_prefix = split_path(
+            thumbnail_settings.THUMBNAIL_PREFIX.strip('/'),
+        )
+        if options['reset'] and os.path.exists(settings.MEDIA_GC_STATE_FILE):
+            os.remove(settings.MEDIA_GC_STATE_FILE)
+        while True:
+            self.collect()
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def load_state(self):
+        try:
+            with open(settings.MEDIA_GC_STATE_FILE) as file:
+                return json.load(file)['after']
+        except FileNotFoundError:
+            return ''
+
+    def save_state(self, after):
+        path = settings.MEDIA_GC_STATE_FILE
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump({'after': after}, file)
+        os.replace(f'{path}.tmp', path)
+
+    def files(self, after):
+        for prefix in sorted(settings.MEDIA_GC_PATHS, key=split_path):
+            yield from walk(self.root, prefix, split_path(after))
+
+    def collect(self):
+        started = time.perf_counter()
+        limit = self.options['limit']
+        after = self.load_state()
+        self.scanned = self.removed = self.reclaimed = 0
+        batch = []
+        finished = True
+        for path, entry in self.files(after):
+            batch.append((path, entry))
+            if len(batch) >= self.options['batch_size']:
+                self.process(batch)
+                after = batch[-1][0]
+                batch = []
+                if self.options['action'] != 'report':
+                    self.save_state(after)
+            if limit and self.scanned + len(batch) >= limit:
+                finished = False
+                break
+        if batch:
+            self.process(batch)
+            after = batch[-1][0]
+        if self.options['action'] != 'report':
+            self.save_state('' if finished else after)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {self.scanned}, ненужных: {self.removed}, '
+            f'освобождено байт: {self.reclaimed} за '
+            f'{time.perf_counter() - started:.1f} с'
+            + ('' if finished else f'; продолжение после {after}')
+        ))
+
+    def process(self, batch):
+        self.scanned += len(batch)
+        deadline = time.time() - self.options['min_age']
+        candidates = {}
+        for path, entry in batch:
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime < deadline:
+                candidates[path] = stat.st_size
+        if not candidates:
+            return
+        referenced = find_referenced(candidates)
+        orphans = [path for path in candidates if path not in referenced]
+        for path in orphans:
+            self.remove(path)
+            self.removed += 1
+            self.reclaimed += candidates[path]
+        if self.options['action'] != 'report':
+            ImageBlob.objects.filter(name__in=orphans, refs=0).delete()
+
+    def is_variant(self, path):
+        parts = split_path(path)
+        return parts[:len(self.thumbnail_prefix)] == self.thumbnail_prefix
+
+    def remove(self, path):
+        action = self.options['action']
+        if action == 'report':
+            self.stdout.write(path)
+            return
+        source = os.path.join(self.root, path)
+        if action == 'quarantine':
+            target = os.path.join(settings.MEDIA_GC_QUARANTINE_DIR, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(source, target)
+        else:
+            os.remove(source)
+        if self.is_variant(path):
+            # Иначе sorl вернёт из своего хранилища ключей имя удалённой
+            # копии, если ту же картинку снова загрузят.
+            thumbnail_default.kvstore.delete(
+                ImageFile(path, thumbnail_default.storage),
+                delete_thumbnails=False,
+            )
@@ -0,0 +1,361 @@
+import os
+import random
+import time
+from bisect import bisect_left
+from functools import partial
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from PIL import Image
+
+from recipes.models import (Favorite, ImageBlob, Ingredient,
+                            IngredientQuantity, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag, User)
+from recipes.versions import CATALOG_VERSION, TAGS_VERSION, bump_version
+from users.models import Subscribe
+
+PLACEHOLDER_DIR = os.path.join('recipes', 'fake')
+PLACEHOLDER_SIZE = (64, 48)
+PARETO_ALPHA = 1.5
+PARETO_MEAN = PARETO_ALPHA / (PARETO_ALPHA - 1)
+MAX_INGREDIENTS = 12
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+
+_cum_weights = {}
+
+
+def zipf_cum_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для size элементов."""
+    key = (size, exponent)
+    if key not in _cum_weights:
+        total = 0.0
+        weights = []
+        for rank in range(1, size + 1):
+            total += rank ** -exponent
+            weights.append(total)
+        _cum_weights[key] = weights
+    return _cum_weights[key]
+
+
+def zipf_choice(rng, cum_weights):
+    return bisect_left(cum_weights, rng.random() * cum_weights[-1])
+
+
+def zipf_sample(rng, cum_weights, count):
+    """Возвращает count различных индексов с учётом популярности."""
+    count = min(count, len(cum_weights))
+    picked = set()
+    while len(picked) < count:
+        picked.add(zipf_choice(rng, cum_weights))
+    return picked
+
+
+def skewed_count(rng, mean, limit):
+    count = mean * rng.paretovariate(PARETO_ALPHA) / PARETO_MEAN
+    return min(int(count), limit)
+
+
+def insert_rows(model, columns, rows):
+    """Вставляет простые строки в таблицу модели одним executemany.
+
+    Для миллионов строк связей это на порядок быстрее bulk_create,
+    которому приходится собирать SQL из экземпляров моделей.
+    """
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, list(rows))
+
+
+def build_recipes(chunk, seed, users, ingredients, tags, images, exponent):
+    """Генерирует строки рецептов для диапазона chunk = (index, start, stop).
+
+    Возвращает кортежи из индексов, поэтому результат не зависит от
+    числа процессов и не требует доступа к базе.
+    """
+    index, start, stop = chunk
+    rng = random.Random(f'{seed}:recipes:{index}')
+    authors = zipf_cum_weights(users, exponent)
+    rows = []
+    for number in range(start, stop):
+        rows.append((
+            number,
+            zipf_choice(rng, authors),
+            rng.randint(1, 180),
+            number % images,
+            rng.sample(range(tags), rng.randint(1, tags)),
+            [
+                (ingredient, rng.randint(1, 500))
+                for ingredient in rng.sample(
+                    range(ingredients),
+                    rng.randint(1, min(MAX_INGREDIENTS, ingredients)),
+                )
+            ],
+        ))
+    return rows
+
+
+def build_relations(chunk, seed, kind, targets, mean, exponent):
+    """Генерирует пары (пользователь, объект) для диапазона пользователей."""
+    index, start, stop = chunk
+    rng = random.Random(f'{seed}:{kind}:{index}')
+    cum_weights = zipf_cum_weights(targets, exponent)
+    rows = []
+    for user in range(start, stop):
+        picked = zipf_sample(
+            rng, cum_weights, skewed_count(rng, mean, targets),
+        )
+        rows.extend((user, target) for target in picked)
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует большой объём синтетических данных для нагрузочного '
+        'тестирования: пользователей, рецепты, избранное, списки покупок '
+        'и подписки с неравномерной популярностью.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--favorites', type=float, default=5,
+            help='Среднее число избранных рецептов на пользователя.',
+        )
+        parser.add_argument(
+            '--cart', type=float, default=2,
+            help='Среднее число рецептов в списке покупок.',
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=3,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов для генерации строк.',
+        )
+        parser.add_argument(
+            '--images', type=int, default=10,
+            help='Число разных картинок-заглушек.',
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности.',
+        )
+        parser.add_argument('--password', default='fake-password')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните import_csv.'
+            )
+        self.tune_sqlite()
+        tag_ids = self.get_tag_ids()
+        images = self.write_placeholders(options['images'])
+        user_ids = self.create_users(options['users'], options['password'])
+        if not user_ids:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        new_user_ids = user_ids[len(user_ids) - options['users']:]
+        recipe_ids = self.create_recipes(
+            options['recipes'], user_ids, ingredient_ids, tag_ids, images,
+        )
+        ImageBlob.objects.rebuild()
+        self.create_relations(
+            'favorites', Favorite, new_user_ids, recipe_ids,
+            options['favorites'],
+            lambda user, recipe: Favorite(user_id=user, recipe_id=recipe),
+        )
+        self.create_relations(
+            'cart', ShoppingCart, new_user_ids, recipe_ids, options['cart'],
+            lambda user, recipe: ShoppingCart(user_id=user, recipe_id=recipe),
+        )
+        self.rebuild_shopping_lists(new_user_ids)
+        self.create_relations(
+            'subscriptions', Subscribe, new_user_ids, user_ids,
+            options['subscriptions'],
+            lambda user, author: Subscribe(
+                following_id=user, author_id=author,
+            ),
+            exclude_self=True,
+        )
+        bump_version(CATALOG_VERSION)
+
+    def tune_sqlite(self):
+        """Отключает синхронную запись SQLite на время генерации."""
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute('PRAGMA journal_mode = MEMORY')
+
+    def chunks(self, total):
+        return [
+            (index, start, min(start + self.batch_size, total))
+            for index, start in enumerate(range(0, total, self.batch_size))
+        ]
+
+    def generate(self, function, chunks):
+        """Отдаёт сгенерированные пачки строк по порядку."""
+        if self.options['workers'] <= 1:
+            yield from map(function, chunks)
+            return
+        connections.close_all()
+        with Pool(self.options['workers']) as pool:
+            self.tune_sqlite()
+            yield from pool.imap(function, chunks)
+
+    def report(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с)'
+        )
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug, color=color)
+                for name, slug, color in DEFAULT_TAGS
+            )
+            bump_version(TAGS_VERSION)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def write_placeholders(self, count):
+        """Создаёт маленькие картинки, общие для всех рецептов."""
+        directory = os.path.join(settings.MEDIA_ROOT, PLACEHOLDER_DIR)
+        os.makedirs(directory, exist_ok=True)
+        rng = random.Random(self.options['seed'])
+        names = []
+        for number in range(max(count, 1)):
+            name = os.path.join(PLACEHOLDER_DIR, f'placeholder_{number}.jpg')
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if not os.path.exists(path):
+                color = tuple(rng.randrange(256) for _ in range(3))
+                Image.new('RGB', PLACEHOLDER_SIZE, color).save(path, 'JPEG')
+            names.append(name)
+        return names
+
+    def create_users(self, count, password):
+        started = time.perf_counter()
+        offset = User.objects.count()
+        password = make_password(password)
+        for _, start, stop in self.chunks(count):
+            User.objects.bulk_create(
+                User(
+                    username=f'fake{offset + number}',
+                    email=f'fake{offset + number}@example.com',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                    password=password,
+                ) for number in range(start, stop)
+            )
+        self.report('Пользователи', count, started)
+        return list(
+            User.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    def create_recipes(self, count, user_ids, ingredient_ids, tag_ids,
+                       images):
+        started = time.perf_counter()
+        offset = Recipe.objects.count()
+        function = partial(
+            build_recipes,
+            seed=self.options['seed'],
+            users=len(user_ids),
+            ingredients=len(ingredient_ids),
+            tags=len(tag_ids),
+            images=len(images),
+            exponent=self.options['zipf'],
+        )
+        created = 0
+        for rows in self.generate(function, self.chunks(count)):
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author_id=user_ids[author],
+                        name=f'Рецепт {offset + number}',
+                        image=images[image],
+                        cooking_time=cooking_time,
+                        text=f'Описание рецепта {offset + number}.',
+                    )
+                    for number, author, cooking_time, image, _, _ in rows
+                )
+                insert_rows(
+                    IngredientQuantity,
+                    ('current_recipe_id', 'ingredient_id', 'amount'),
+                    (
+                        (recipe.id, ingredient_ids[ingredient], amount)
+                        for recipe, row in zip(recipes, rows)
+                        for ingredient, amount in row[5]
+                    ),
+                )
+                insert_rows(
+                    Recipe.tags.through,
+                    ('recipe_id', 'tag_id'),
+                    (
+                        (recipe.id, tag_ids[tag])
+                        for recipe, row in zip(recipes, rows)
+                        for tag in row[4]
+                    ),
+                )
+            created += len(rows)
+        self.report('Рецепты', created, started)
+        return list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    def rebuild_shopping_lists(self, user_ids):
+        started = time.perf_counter()
+        created = 0
+        with transaction.atomic():
+            for start in range(0, len(user_ids), self.batch_size):
+                created += ShoppingListItem.objects.rebuild(
+                    user_ids[start:start + self.batch_size],
+                    self.batch_size,
+                )
+        self.report('Позиции списков покупок', created, started)
+
+    def create_relations(self, kind, model, user_ids, target_ids, mean,
+                         factory, exclude_self=False):
+        if mean <= 0 or not target_ids:
+            return
+        started = time.perf_counter()
+        function = partial(
+            build_relations,
+            seed=self.options['seed'],
+            kind=kind,
+            targets=len(target_ids),
+            mean=mean,
+            exponent=self.options['zipf'],
+        )
+        created = 0
+        for rows in self.generate(function, self.chunks(len(user_ids))):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    (
+                        factory(user_ids[user], target_ids[target])
+                        for user, target in rows
+                        if not exclude_self
+                        or user_ids[user] != target_ids[target]
+                    ),
+                    batch_size=self.batch_size,
+                    ignore_conflicts=True,
+                )
+            created += len(rows)
+        self.report(model._meta.verbose_name_plural, created, started)
@@ -1,20 +1,118 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.versions import CATALOG_VERSION, INGREDIENTS_VERSION, bump_version
+
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file, delimiter=','):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def read_json(file):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком.
+
+    Обрезанный файл, испорченная запись или массив без закрывающей
+    скобки дают CommandError, и импорт откатывается целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in iter(lambda: file.read(JSON_CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив ингредиентов.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+    raise_json_end_error(decoder, buffer[position:], started)
+
+
+def raise_json_end_error(decoder, rest, started):
+    """Объясняет, почему файл кончился раньше закрывающей скобки."""
+    if not started:
+        raise CommandError('Ожидается JSON-массив ингредиентов.')
+    if rest.strip():
+        try:
+            decoder.raw_decode(rest.strip())
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Некорректная запись JSON: {error}')
+    raise CommandError('JSON-массив не закрыт: нет «]».')
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
 
 
 class Command(BaseCommand):
-    help = 'import data from csv'
+    help = 'Импорт ингредиентов из CSV или JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к файлу ingredients.csv или ingredients.json.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
 
     def handle(self, *args, **options):
-        with open('data/ingredients.csv', 'r', encoding="utf-8") as csv_file:
-            reader = csv.reader(csv_file, delimiter=',')
-            for row in reader:
-                name, unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=unit,
-                )
-    print('Импорт выполнен')
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        started = time.perf_counter()
+        processed = 0
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            before = Ingredient.objects.count()
+            rows = reader(file)
+            try:
+                while batch := list(islice(rows, options['batch_size'])):
+                    Ingredient.objects.bulk_create(
+                        (
+                            Ingredient(name=name, measurement_unit=unit)
+                            for name, unit in batch
+                        ),
+                        ignore_conflicts=True,
+                    )
+                    processed += len(batch)
+            except (KeyError, TypeError, ValueError) as error:
+                raise CommandError(
+                    f'Некорректная запись после {processed} строк: {error!r}'
+                ) from error
+            inserted = Ingredient.objects.count() - before
+        if inserted:
+            bump_version(INGREDIENTS_VERSION)
+            bump_version(CATALOG_VERSION)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт выполнен: обработано {processed}, добавлено {inserted}, '
+            f'пропущено {processed - inserted} за {elapsed:.2f} с '
+            f'({processed / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from recipes.versions import CART_VERSION, bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает суммы ингредиентов в списках покупок '
+        'и сверяет их с рецептами из корзин.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', nargs='+', type=int,
+            help='id пользователей; по умолчанию все.',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить суммы, ничего не меняя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        mismatches = self.verify(options['users'], options['batch_size'])
+        if not options['check']:
+            # Пересобираются и получают новую версию кеша только списки
+            # с расхождениями, а не все: иначе кеши сбросятся у всех.
+            user_ids = sorted({user_id for user_id, _text in mismatches})
+            created = 0
+            if user_ids:
+                with transaction.atomic():
+                    created = ShoppingListItem.objects.rebuild(
+                        user_ids, options['batch_size'],
+                    )
+                for user_id in user_ids:
+                    bump_version(CART_VERSION.format(user_id=user_id))
+                mismatches = self.verify(user_ids, options['batch_size'])
+            self.stdout.write(
+                f'Пересобрано списков: {len(user_ids)}, создано позиций: '
+                f'{created} за {time.perf_counter() - started:.1f} с'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}\n'
+                + '\n'.join(text for _user_id, text in mismatches[:20])
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок сходятся.'))
+
+    def verify(self, user_ids, batch_size):
+        """Сравнивает сохранённые суммы с пересчитанными слиянием.
+
+        Возвращает пары (id пользователя, описание расхождения).
+        """
+        stored = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+        stored = stored.values_list(
+            'user_id', 'ingredient_id', 'total',
+        ).order_by('user_id', 'ingredient_id').iterator(batch_size)
+        expected = ShoppingListItem.objects.calculate(
+            user_ids,
+        ).iterator(batch_size)
+        mismatches = []
+        stored_row = next(stored, None)
+        expected_row = next(expected, None)
+        while stored_row is not None or expected_row is not None:
+            if expected_row is None or (
+                stored_row is not None and stored_row[:2] < expected_row[:2]
+            ):
+                mismatches.append(
+                    (stored_row[0], f'Лишняя позиция {stored_row}'),
+                )
+                stored_row = next(stored, None)
+            elif stored_row is None or expected_row[:2] < stored_row[:2]:
+                mismatches.append(
+                    (expected_row[0], f'Нет позиции {expected_row}'),
+                )
+                expected_row = next(expected, None)
+            else:
+                if stored_row[2] != expected_row[2]:
+                    mismatches.append((stored_row[0], (
+                        f'{stored_row[:2]}: {stored_row[2]} '
+                        f'вместо {expected_row[2]}'
+                    )))
+                stored_row = next(stored, None)
+                expected_row = next(expected, None)
+        return mismatches
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.3 on 2026-10-18 22:42
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает дубли ингредиентов перед добавлением ограничения."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientQuantity = apps.get_model('recipes', 'IngredientQuantity')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit',
+    ).annotate(
+        keep_id=models.Min('id'),
+        total=models.Count('id'),
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+        recipes_with_kept = IngredientQuantity.objects.filter(
+            ingredient_id=keep_id,
+        ).values('current_recipe_id')
+        IngredientQuantity.objects.filter(
+            ingredient_id__in=extra_ids,
+            current_recipe_id__in=recipes_with_kept,
+        ).delete()
+        for extra_id in extra_ids:
+            recipes_with_kept = IngredientQuantity.objects.filter(
+                ingredient_id=keep_id,
+            ).values('current_recipe_id')
+            IngredientQuantity.objects.filter(
+                ingredient_id=extra_id,
+            ).exclude(
+                current_recipe_id__in=recipes_with_kept,
+            ).update(ingredient_id=keep_id)
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_alter_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop,
+        ),
+    ]
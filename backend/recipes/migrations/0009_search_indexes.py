@@ -0,0 +1,19 @@
+from django.db import migrations
+from foodgram.search_indexes import create_search_indexes
+
+INDEXES = (
+    ('recipes_ingredient', 'name'),
+    ('recipes_recipe', 'name'),
+)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0008_ingredient_unique_name_measurement_unit'),
+    ]
+
+    operations = [
+        create_search_indexes(INDEXES),
+    ]
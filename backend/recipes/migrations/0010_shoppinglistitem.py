@@ -0,0 +1,61 @@
+# Generated by Django 4.2.3 on 2026-10-18 22:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    IngredientQuantity = apps.get_model('recipes', 'IngredientQuantity')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    totals = IngredientQuantity.objects.filter(
+        current_recipe__cart_recipe__isnull=False,
+    ).values_list(
+        'current_recipe__cart_recipe__user_id',
+        'ingredient_id',
+    ).annotate(
+        total=models.Sum('amount'),
+    ).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total=total,
+            )
+            for user_id, ingredient_id, total in totals.iterator()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(
+            fill_shopping_lists,
+            migrations.RunPython.noop,
+        ),
+    ]
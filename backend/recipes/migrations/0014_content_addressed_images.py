@@ -0,0 +1,49 @@
+# Generated by Django 4.2.3 on 2026-10-18 23:14
+
+from django.db import migrations, models
+import recipes.storage
+
+
+def count_image_refs(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ImageBlob = apps.get_model('recipes', 'ImageBlob')
+    refs = Recipe.objects.exclude(image='').values_list(
+        'image',
+    ).annotate(
+        refs=models.Count('pk'),
+    ).order_by()
+    ImageBlob.objects.bulk_create(
+        (ImageBlob(name=name, refs=count) for name, count in refs.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.get_recipe_image_storage, upload_to='recipes/images/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(
+            count_image_refs,
+            migrations.RunPython.noop,
+        ),
+    ]
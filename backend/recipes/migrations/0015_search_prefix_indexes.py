@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-19 00:04
+
+from django.db import migrations
+import foodgram.search_indexes
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0014_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=foodgram.search_indexes.PrefixSearchIndex(fields=['name'], name='ingredient_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=foodgram.search_indexes.PrefixSearchIndex(fields=['name'], name='recipe_name_prefix_idx'),
+        ),
+        foodgram.search_indexes.drop_legacy_prefix_indexes((
+            ('recipes_ingredient', 'name'),
+            ('recipes_recipe', 'name'),
+        )),
+    ]
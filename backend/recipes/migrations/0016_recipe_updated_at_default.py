@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-19 00:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_search_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='Дата изменения'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.3 on 2026-10-19 01:10
+
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.db import migrations
+from django.db.models import F
+
+BATCH_SIZE = 2000
+
+
+def count_variant_refs(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ImageBlob = apps.get_model('recipes', 'ImageBlob')
+    files = Recipe.objects.values_list(
+        'image_variants__files', flat=True,
+    ).iterator(chunk_size=BATCH_SIZE)
+    while batch := list(islice(files, BATCH_SIZE)):
+        counts = Counter(
+            name for variants in batch if variants
+            for name in variants.values()
+        )
+        ImageBlob.objects.bulk_create(
+            (ImageBlob(name=name, refs=0) for name in counts),
+            ignore_conflicts=True,
+        )
+        names_by_count = defaultdict(list)
+        for name, count in counts.items():
+            names_by_count[count].append(name)
+        for count, names in names_by_count.items():
+            ImageBlob.objects.filter(name__in=names).update(
+                refs=F('refs') + count,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_updated_at_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            count_variant_refs,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -1,9 +1,18 @@
 """Модели для приложения recipes."""
+from collections import Counter, defaultdict
+from itertools import islice
+
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from foodgram import settings
+from foodgram.search_indexes import PrefixSearchIndex
+
+from .storage import get_recipe_image_storage
+from users.models import Subscribe
 
 User = get_user_model()
 
@@ -15,6 +24,69 @@ def image_recipe_upload_user_folder(instance, filename):
     return 'recipes/recipe_images/user_id_{0}/{1}'.format(instance.author.id, filename)
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами избранного и списка покупок."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk'),
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk'),
+                )
+            ),
+        )
+
+    def with_author_subscription(self, user):
+        """Аннотирует рецепты признаком подписки на автора."""
+        if not user.is_authenticated:
+            return self.annotate(
+                author_is_subscribed=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            author_is_subscribed=models.Exists(
+                Subscribe.objects.filter(
+                    following=user,
+                    author=models.OuterRef('author'),
+                )
+            ),
+        )
+
+    def for_read(self, user):
+        """Рецепты со всеми связями, нужными для вывода в API."""
+        return self.with_user_flags(
+            user,
+        ).with_author_subscription(
+            user,
+        ).select_related(
+            'author',
+        ).prefetch_related(
+            'tags',
+            models.Prefetch(
+                'ingridientsquantity',
+                queryset=IngredientQuantity.objects.select_related(
+                    'ingredient',
+                ),
+            ),
+        )
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         max_length=settings.INGREDIENT_NAME_MAX_LENGTH,
@@ -29,6 +101,18 @@ class Ingredient(models.Model):
         ordering = ('name', )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = (
+            PrefixSearchIndex(
+                fields=('name',),
+                name='ingredient_name_prefix_idx',
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_name_measurement_unit',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -113,7 +197,14 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name='Картинка',
-        upload_to=image_recipe_upload_user_folder,
+        upload_to='recipes/images/',
+        storage=get_recipe_image_storage,
+    )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
     )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления',
@@ -140,11 +231,28 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    # Не auto_now: загрузка фикстур сохраняет строки как есть и не
+    # заполняет такие поля, а default у auto_now запрещён.
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            PrefixSearchIndex(fields=('name',), name='recipe_name_prefix_idx'),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('name',),
@@ -154,6 +262,10 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.updated_at = timezone.now()
+        super().save(*args, **kwargs)
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -209,3 +321,221 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe} в списке у {self.user}'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    def apply_amounts(self, amounts, user_ids, sign):
+        """Прибавляет (sign=1) или вычитает (sign=-1) количества
+        amounts = {id ингредиента: количество} в списках покупок user_ids.
+        """
+        user_ids = list(user_ids)
+        if not amounts or not user_ids:
+            return
+        if sign > 0:
+            self.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total=0,
+                    )
+                    for user_id in user_ids
+                    for ingredient_id in amounts
+                ),
+                ignore_conflicts=True,
+            )
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=amounts)
+        items.update(total=Greatest(
+            models.F('total') + sign * models.Case(
+                *(
+                    models.When(ingredient_id=ingredient_id, then=amount)
+                    for ingredient_id, amount in amounts.items()
+                ),
+                output_field=models.PositiveIntegerField(),
+            ),
+            0,
+        ))
+        if sign < 0:
+            items.filter(total=0).delete()
+
+    @staticmethod
+    def get_recipe_amounts(recipe_id):
+        return dict(IngredientQuantity.objects.filter(
+            current_recipe_id=recipe_id,
+        ).values_list('ingredient_id', 'amount'))
+
+    def add_recipe(self, recipe_id, user_ids):
+        """Прибавляет ингредиенты рецепта к спискам покупок user_ids."""
+        self.apply_amounts(self.get_recipe_amounts(recipe_id), user_ids, 1)
+
+    def remove_recipe(self, recipe_id, user_ids):
+        """Вычитает ингредиенты рецепта из списков покупок user_ids."""
+        self.apply_amounts(self.get_recipe_amounts(recipe_id), user_ids, -1)
+
+    def calculate(self, user_ids=None):
+        """Суммы ингредиентов, посчитанные заново по спискам покупок."""
+        # Условие на корзину задаётся одним filter(): повторный filter()
+        # по обратной связи добавил бы второй JOIN и размножил суммы.
+        if user_ids is None:
+            lookup = {'current_recipe__cart_recipe__isnull': False}
+        else:
+            lookup = {'current_recipe__cart_recipe__user_id__in': user_ids}
+        return IngredientQuantity.objects.filter(**lookup).values_list(
+            'current_recipe__cart_recipe__user_id',
+            'ingredient_id',
+        ).annotate(
+            total=models.Sum('amount'),
+        ).order_by(
+            'current_recipe__cart_recipe__user_id',
+            'ingredient_id',
+        )
+
+    def rebuild(self, user_ids=None, batch_size=5000):
+        """Пересобирает списки покупок user_ids или всех пользователей.
+
+        Возвращает число созданных позиций.
+        """
+        items = self if user_ids is None else self.filter(user_id__in=user_ids)
+        items.delete()
+        return len(self.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total=total,
+                )
+                for user_id, ingredient_id, total in self.calculate(
+                    user_ids,
+                ).iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+        ))
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента в списке покупок пользователя.
+
+    Поддерживается сигналами ShoppingCart и IngredientQuantity при
+    любом их изменении, в том числе из админки и каскадном удалении,
+    чтобы выгрузка списка читала одну таблицу вместо агрегирования по
+    всем рецептам. bulk_create и update() сигналов не вызывают: после
+    них суммы нужно поправить вручную или командой rebuild_shopping_lists.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+    )
+    total = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient}: {self.total} у {self.user}'
+
+
+class ImageBlobQuerySet(models.QuerySet):
+    VARIANTS_BATCH_SIZE = 2000
+
+    def change_refs(self, names, delta):
+        """Сдвигает счётчики ссылок на файлы names на delta."""
+        names = [name for name in names if name]
+        if not names:
+            return
+        if delta > 0:
+            self.bulk_create(
+                (ImageBlob(name=name, refs=0) for name in names),
+                ignore_conflicts=True,
+            )
+        self.filter(name__in=names).update(
+            refs=Greatest(models.F('refs') + delta, 0),
+        )
+
+    def add_refs(self, counts):
+        """Прибавляет ссылки по словарю {файл: число ссылок}."""
+        names_by_count = defaultdict(list)
+        for name, count in counts.items():
+            names_by_count[count].append(name)
+        for count, names in names_by_count.items():
+            self.change_refs(names, count)
+
+    def calculate(self):
+        """Число рецептов на каждый файл картинки."""
+        return Recipe.objects.exclude(image='').values_list(
+            'image',
+        ).annotate(
+            refs=models.Count('pk'),
+        ).order_by('image')
+
+    def calculate_variants(self):
+        """Число ссылок на уменьшенные копии по пачкам рецептов.
+
+        Пути лежат внутри JSON image_variants, поэтому сгруппировать их
+        в базе нельзя; пачки не дают держать в памяти все пути сразу.
+        """
+        files = Recipe.objects.values_list(
+            'image_variants__files', flat=True,
+        ).iterator(chunk_size=self.VARIANTS_BATCH_SIZE)
+        while batch := list(islice(files, self.VARIANTS_BATCH_SIZE)):
+            yield Counter(
+                name for variants in batch if variants
+                for name in variants.values()
+            )
+
+    def rebuild(self):
+        """Пересчитывает счётчики ссылок по рецептам."""
+        self.all().delete()
+        self.bulk_create(
+            ImageBlob(name=name, refs=refs)
+            for name, refs in self.calculate()
+        )
+        for counts in self.calculate_variants():
+            self.add_refs(counts)
+        return self.count()
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище с адресацией по содержимому.
+
+    Одинаковые картинки разных рецептов хранятся одним файлом, refs
+    считает ссылающиеся на него рецепты. Уменьшенные копии из
+    Recipe.image_variants учитываются так же. Файлы без ссылок удаляются
+    сборщиком мусора, а не сразу: их может подхватить новый рецепт.
+    """
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Файл',
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число ссылок',
+    )
+
+    objects = ImageBlobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
@@ -0,0 +1,203 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .images import get_variant_files, schedule_variants
+from .models import (Favorite, ImageBlob, Ingredient, IngredientQuantity,
+                     Recipe, ShoppingCart, ShoppingListItem, Tag)
+from .versions import (CART_VERSION, CATALOG_VERSION, FAVORITES_VERSION,
+                       INGREDIENTS_VERSION, SUBSCRIPTIONS_VERSION,
+                       TAGS_VERSION, bump_version_on_commit)
+from users.models import Subscribe
+
+
+def touch_recipes(recipes):
+    """Сдвигает updated_at рецептов, не вызывая их сигналов."""
+    recipes.update(updated_at=timezone.now())
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=IngredientQuantity)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_catalog_version(using, **kwargs):
+    bump_version_on_commit(CATALOG_VERSION, using)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    source = instance.image_variants.get('source')
+    if instance.image and source != instance.image.name:
+        schedule_variants(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(instance, **kwargs):
+    instance._saved_image = None
+    instance._saved_variants = None
+    if instance.pk is not None:
+        instance._saved_image, instance._saved_variants = (
+            Recipe.objects.filter(pk=instance.pk).values_list(
+                'image', 'image_variants',
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe_image_refs(instance, **kwargs):
+    saved_image = getattr(instance, '_saved_image', None)
+    if instance.image.name != saved_image:
+        ImageBlob.objects.change_refs([instance.image.name], 1)
+        ImageBlob.objects.change_refs([saved_image], -1)
+    saved_files = get_variant_files(getattr(instance, '_saved_variants', None))
+    files = get_variant_files(instance.image_variants)
+    if files != saved_files:
+        ImageBlob.objects.change_refs(files, 1)
+        ImageBlob.objects.change_refs(saved_files, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(instance, **kwargs):
+    ImageBlob.objects.change_refs([instance.image.name], -1)
+    ImageBlob.objects.change_refs(
+        get_variant_files(instance.image_variants), -1,
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(using, **kwargs):
+    bump_version_on_commit(INGREDIENTS_VERSION, using)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(using, **kwargs):
+    bump_version_on_commit(TAGS_VERSION, using)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def bump_cart_version(instance, using, **kwargs):
+    bump_version_on_commit(
+        CART_VERSION.format(user_id=instance.user_id), using,
+    )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def bump_favorites_version(instance, using, **kwargs):
+    bump_version_on_commit(
+        FAVORITES_VERSION.format(user_id=instance.user_id), using,
+    )
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def bump_subscriptions_version(instance, using, **kwargs):
+    bump_version_on_commit(
+        SUBSCRIPTIONS_VERSION.format(user_id=instance.following_id), using,
+    )
+
+
+@receiver((post_save, post_delete), sender=IngredientQuantity)
+def touch_recipe_with_quantity(instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(pk=instance.current_recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_with_ingredient(instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(
+            ingridientsquantity__ingredient=instance,
+        ))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def touch_recipes_with_tag(instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipes_with_changed_tags(instance, action, reverse, pk_set,
+                                    **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        touch_recipes(Recipe.objects.filter(pk=instance.pk))
+    elif reverse and action in ('post_add', 'post_remove'):
+        touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+    elif reverse and action == 'pre_clear':
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver((post_save, post_delete), sender=IngredientQuantity)
+def bump_carts_with_recipe(instance, using, **kwargs):
+    for user_id in get_cart_user_ids(instance.current_recipe_id):
+        bump_version_on_commit(CART_VERSION.format(user_id=user_id), using)
+
+
+# Суммы списков покупок. Каждый сигнал смотрит на текущее состояние
+# другой таблицы, поэтому при каскадном удалении рецепта суммы сходятся
+# в любом порядке: кто удалён вторым, тот уже ничего не вычитает.
+def get_cart_user_ids(recipe_id):
+    return list(ShoppingCart.objects.filter(
+        recipe_id=recipe_id,
+    ).values_list('user_id', flat=True))
+
+
+@receiver(pre_save, sender=IngredientQuantity)
+def remember_quantity(instance, **kwargs):
+    instance._saved_quantity = None
+    if instance.pk is not None:
+        instance._saved_quantity = IngredientQuantity.objects.filter(
+            pk=instance.pk,
+        ).values_list('current_recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientQuantity)
+def update_shopping_lists_with_quantity(instance, **kwargs):
+    saved = getattr(instance, '_saved_quantity', None)
+    if saved is not None:
+        recipe_id, ingredient_id, amount = saved
+        ShoppingListItem.objects.apply_amounts(
+            {ingredient_id: amount}, get_cart_user_ids(recipe_id), -1,
+        )
+    ShoppingListItem.objects.apply_amounts(
+        {instance.ingredient_id: instance.amount},
+        get_cart_user_ids(instance.current_recipe_id),
+        1,
+    )
+
+
+@receiver(post_delete, sender=IngredientQuantity)
+def subtract_deleted_quantity(instance, **kwargs):
+    ShoppingListItem.objects.apply_amounts(
+        {instance.ingredient_id: instance.amount},
+        get_cart_user_ids(instance.current_recipe_id),
+        -1,
+    )
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remember_cart_recipe(instance, **kwargs):
+    instance._saved_cart = None
+    if instance.pk is not None:
+        instance._saved_cart = ShoppingCart.objects.filter(
+            pk=instance.pk,
+        ).values_list('user_id', 'recipe_id').first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_recipe_to_shopping_list(instance, **kwargs):
+    saved = getattr(instance, '_saved_cart', None)
+    if saved == (instance.user_id, instance.recipe_id):
+        return
+    if saved is not None:
+        user_id, recipe_id = saved
+        ShoppingListItem.objects.remove_recipe(recipe_id, [user_id])
+    ShoppingListItem.objects.add_recipe(
+        instance.recipe_id, [instance.user_id],
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_cart_recipe_from_shopping_list(instance, **kwargs):
+    ShoppingListItem.objects.remove_recipe(
+        instance.recipe_id, [instance.user_id],
+    )
@@ -0,0 +1,69 @@
+"""Хранилище картинок рецептов с адресацией по содержимому."""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class AlreadyStored(Exception):
+    pass
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Называет файлы по sha256 содержимого.
+
+    Каталог берётся из upload_to, а имя файла заменяется на хеш,
+    поэтому одинаковые картинки хранятся одним файлом: если файл
+    с таким хешем уже есть, запись на диск пропускается.
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        return os.path.join(
+            directory,
+            digest[:2],
+            digest + os.path.splitext(filename)[1].lower(),
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        try:
+            return super().save(name, content, max_length)
+        except AlreadyStored:
+            # Свежее время изменения защищает файл от сборщика мусора,
+            # пока рецепт с ним не сохранён.
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                return super().save(name, content, max_length)
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        """Вызывается перед записью и повторно, если файл появился.
+
+        В обоих случаях существующий файл уже содержит те же байты,
+        поэтому запись прерывается, а не получает новое имя.
+        """
+        if self.exists(name):
+            raise AlreadyStored(name)
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
+
+
+def get_recipe_image_storage():
+    return recipe_image_storage
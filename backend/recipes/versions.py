@@ -0,0 +1,73 @@
+"""Версии данных для инвалидации кешей во всех процессах."""
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from foodgram.db_router import CATALOG_PIN, pin_to_primary
+
+INGREDIENTS_VERSION = 'ingredients'
+TAGS_VERSION = 'tags'
+CART_VERSION = 'cart:{user_id}'
+CATALOG_VERSION = 'catalog'
+FAVORITES_VERSION = 'favorites:{user_id}'
+RECIPE_VERSION = 'recipe:{pk}'
+SUBSCRIPTIONS_VERSION = 'subscriptions:{user_id}'
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """Текущая версия набора данных name.
+
+    Начальное значение берётся от времени, поэтому после очистки кеша
+    версия не совпадёт ни с одной из тех, что уже видели процессы.
+    """
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), time.time_ns(), timeout=None)
+        version = cache.get(_key(name))
+    return version
+
+
+def get_user_state(user):
+    """Версии избранного, списка покупок и подписок пользователя.
+
+    От них зависят флаги и фильтры в ответах API, поэтому строка входит
+    в ключи кешей, общих для выборок разных пользователей.
+    """
+    if not user.is_authenticated:
+        return 'anonymous'
+    return ':'.join(str(part) for part in (
+        user.id,
+        get_version(FAVORITES_VERSION.format(user_id=user.id)),
+        get_version(CART_VERSION.format(user_id=user.id)),
+        get_version(SUBSCRIPTIONS_VERSION.format(user_id=user.id)),
+    ))
+
+
+def bump_version(name):
+    """Сдвигает версию набора данных name после его изменения.
+
+    После изменения каталога все чтения ненадолго идут в основную базу,
+    чтобы кеши с новой версией не заполнились данными отстающей реплики.
+    """
+    if name == CATALOG_VERSION:
+        pin_to_primary(CATALOG_PIN)
+    try:
+        return cache.incr(_key(name))
+    except ValueError:
+        get_version(name)
+        return cache.incr(_key(name))
+
+
+def bump_version_on_commit(name, using=None):
+    """bump_version(name) после фиксации текущей транзакции.
+
+    Если сдвинуть версию раньше, другой процесс успеет заполнить кеш
+    с новой версией ещё старыми данными и отдавать их до следующего
+    изменения.
+    """
+    transaction.on_commit(partial(bump_version, name), using=using)
@@ -8,7 +8,7 @@ class UsersAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'username', 'email', 'first_name', 'last_name',
     )
-    search_fields = ('username',)
+    search_fields = ('username', 'email')
     list_filter = ('is_superuser',)
     empty_value_display = '-пусто-'
 
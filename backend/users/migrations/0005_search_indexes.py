@@ -0,0 +1,19 @@
+from django.db import migrations
+from foodgram.search_indexes import create_search_indexes
+
+INDEXES = (
+    ('users_user', 'username'),
+    ('users_user', 'email'),
+)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('users', '0004_auto_20230710_0848'),
+    ]
+
+    operations = [
+        create_search_indexes(INDEXES),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-19 00:04
+
+from django.db import migrations
+import foodgram.search_indexes
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('users', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=foodgram.search_indexes.PrefixSearchIndex(fields=['username'], name='user_username_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=foodgram.search_indexes.PrefixSearchIndex(fields=['email'], name='user_email_prefix_idx'),
+        ),
+        foodgram.search_indexes.drop_legacy_prefix_indexes((
+            ('users_user', 'username'),
+            ('users_user', 'email'),
+        )),
+    ]
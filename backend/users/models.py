@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from foodgram import settings
+from foodgram.search_indexes import PrefixSearchIndex
 
 from .validators import username_validate
 
@@ -33,6 +34,13 @@ class User(AbstractUser):
         ordering = ('username',)
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = (
+            PrefixSearchIndex(
+                fields=('username',),
+                name='user_username_prefix_idx',
+            ),
+            PrefixSearchIndex(fields=('email',), name='user_email_prefix_idx'),
+        )
 
     def __str__(self):
         return f'{self.username}: {self.email}'